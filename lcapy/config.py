@@ -51,3 +51,40 @@ except:
     
 matrix_inverse_fallback_method = 'ADJ'
 
+# Method to solve the MNA equations A x = Z.  This can be 'inverse'
+# to find the full matrix inverse using matrix_inverse_method, 'LU'
+# for LU decomposition, 'FFLU' for fraction-free LU decomposition,
+# 'GE' for Gauss-Jordan elimination, or 'DM-LU' for LU decomposition
+# with a DomainMatrix.  Solving avoids the expression swell of finding
+# the full inverse since only one right hand side is required.  The
+# 'lazy-LU' and 'cramer' methods only find an unknown when it is
+# required, using back substitution or Cramer's rule.
+matrix_solve_method = 'inverse'
+
+matrix_solve_fallback_method = 'LU'
+
+
+# Can be 'symbolic' or 'sparse'.  The sparse engine solves netlists
+# with numerical component values using a sparse LU factorisation; it
+# falls back on the symbolic engine if any matrix entry is symbolic.
+mna_engine = 'symbolic'
+
+# Simplification policy for the node voltages and branch currents
+# found by MNA.  This can be 'none', 'cancel', 'factor', or 'full'.
+# The simplification is deferred until a value is first accessed.
+# The policy can be overridden for a netlist with its
+# simplify_policy attribute.
+simplify_policy = 'full'
+
+# Number of worker processes used to solve the subnetlists (one for
+# each DC, AC, transient, and noise source kind) concurrently.  If 1,
+# the subnetlists are solved in turn.  If None, the number of CPUs is
+# used.  The workers are created with ProcessPoolExecutor; with the
+# spawn start method (the default on Windows and macOS) each worker
+# imports lcapy afresh and scripts need an
+# if __name__ == '__main__': guard.
+mna_processes = 1
+
+# Maximum number of functions created by lambdify that are cached for
+# Expr.evaluate.  The least recently used functions are discarded.
+evaluate_cache_size = 256
@@ -25,6 +25,138 @@ import sympy as sym
 from sympy.utilities.lambdify import lambdify
 from .sym import simplify
 from collections import OrderedDict
+from . import config
+
+# Cache of the functions created by lambdify for Expr.evaluate keyed
+# by the expression and variable.  The least recently used functions
+# are discarded when there are more than config.evaluate_cache_size.
+evaluate_cache = OrderedDict()
+evaluate_cache_stats = {'hits': 0, 'misses': 0}
+
+
+# For some reason the new lambdify will convert a float
+# argument to complex
+
+def _evaluate_exp(arg):
+
+    # Hack to handle exp(-a * t) * Heaviside(t) for t < 0
+    # by trying to avoid inf when number overflows float.
+
+    if isinstance(arg, complex):
+        if arg.real > 500:
+            arg = 500 + 1j * arg.imag
+    elif arg > 500:
+        arg = 500;                        
+
+    return np.exp(arg)
+
+
+def _evaluate_dirac(arg):
+    return np.inf if arg == 0.0 else 0.0
+
+
+def _evaluate_unitimpulse(arg):
+    return 1.0 if arg == 0 else 0.0            
+
+
+def _evaluate_heaviside(arg):
+    return 1.0 if arg >= 0.0 else 0.0
+
+
+def _evaluate_sqrt(arg):
+    # Large numbers get converted to ints and int has no sqrt
+    # attribute so convert to float.
+    if isinstance(arg, int):
+        arg = float(arg)
+    if not isinstance(arg, complex) and arg < 0:
+        arg = arg + 0j
+    return np.sqrt(arg)
+
+
+# Versions of the above functions that operate on arrays.  These are
+# also used by the simulator.
+
+def _evaluate_array_exp(arg):
+
+    arg = np.asarray(arg)
+    if np.iscomplexobj(arg):
+        arg = np.minimum(arg.real, 500) + 1j * arg.imag
+    else:
+        arg = np.minimum(arg, 500)
+    return np.exp(arg)
+
+
+def _evaluate_array_dirac(arg):
+    return np.where(arg == 0, np.inf, 0.0)
+
+
+def _evaluate_array_unitimpulse(arg):
+    return np.where(arg == 0, 1.0, 0.0)
+
+
+def _evaluate_array_heaviside(arg):
+    return np.where(arg >= 0, 1.0, 0.0)
+
+
+def _evaluate_array_sqrt(arg):
+    # This converts negative arguments to complex.
+    return np.lib.scimath.sqrt(arg)
+
+
+def evaluate_lambdify(expr, var, vector=False):
+    """Return the function created by lambdify to evaluate the SymPy
+    expression `expr` for the variable `var`.  If `vector` is True,
+    the function operates on an array of values.  The functions are
+    cached since lambdify is slow."""
+
+    key = (expr, var, vector)
+    if key in evaluate_cache:
+        evaluate_cache_stats['hits'] += 1
+        evaluate_cache.move_to_end(key)
+        return evaluate_cache[key]
+
+    evaluate_cache_stats['misses'] += 1
+
+    # For negative arguments, np.sqrt will return Nan.
+    # np.lib.scimath.sqrt converts to complex but cannot be used
+    # for lamdification!
+    if vector:
+        funcs = {'DiracDelta' : _evaluate_array_dirac,
+                 'Heaviside' : _evaluate_array_heaviside,
+                 'UnitImpulse' : _evaluate_array_unitimpulse,
+                 'sqrt' : _evaluate_array_sqrt, 'exp' : _evaluate_array_exp}
+    else:
+        funcs = {'DiracDelta' : _evaluate_dirac,
+                 'Heaviside' : _evaluate_heaviside,
+                 'UnitImpulse' : _evaluate_unitimpulse,
+                 'sqrt' : _evaluate_sqrt, 'exp' : _evaluate_exp}
+    func = lambdify(var, expr, (funcs, "scipy", "numpy", "math", "sympy"))
+
+    evaluate_cache[key] = func
+    while len(evaluate_cache) > config.evaluate_cache_size:
+        evaluate_cache.popitem(last=False)
+    return func
+
+
+def evaluate_cache_info():
+    """Return a dictionary with the number of hits and misses of the
+    cache of functions used by Expr.evaluate, its size, and its
+    maximum size."""
+
+    return {'hits': evaluate_cache_stats['hits'],
+            'misses': evaluate_cache_stats['misses'],
+            'size': len(evaluate_cache),
+            'maxsize': config.evaluate_cache_size}
+
+
+def evaluate_cache_clear():
+    """Clear the cache of functions used by Expr.evaluate and reset
+    its statistics."""
+
+    evaluate_cache.clear()
+    evaluate_cache_stats['hits'] = 0
+    evaluate_cache_stats['misses'] = 0
+
 
 class ExprPrint(object):
 
@@ -1088,40 +1220,6 @@ class Expr(ExprPrint, ExprMisc):
         
         def evaluate_expr(expr, var, arg):
 
-            # For some reason the new lambdify will convert a float
-            # argument to complex
-            
-            def exp(arg):
-
-                # Hack to handle exp(-a * t) * Heaviside(t) for t < 0
-                # by trying to avoid inf when number overflows float.
-
-                if isinstance(arg, complex):
-                    if arg.real > 500:
-                        arg = 500 + 1j * arg.imag
-                elif arg > 500:
-                    arg = 500;                        
-
-                return np.exp(arg)
-
-            def dirac(arg):
-                return np.inf if arg == 0.0 else 0.0
-
-            def unitimpulse(arg):
-                return 1.0 if arg == 0 else 0.0            
-
-            def heaviside(arg):
-                return 1.0 if arg >= 0.0 else 0.0
-
-            def sqrt(arg):
-                # Large numbers get converted to ints and int has no sqrt
-                # attribute so convert to float.
-                if isinstance(arg, int):
-                    arg = float(arg)
-                if not isinstance(arg, complex) and arg < 0:
-                    arg = arg + 0j
-                return np.sqrt(arg)
-
             try:
                 arg0 = arg[0]
                 scalar = False
@@ -1129,55 +1227,64 @@ class Expr(ExprPrint, ExprMisc):
                 arg0 = arg
                 scalar = True
 
-            # For negative arguments, np.sqrt will return Nan.
-            # np.lib.scimath.sqrt converts to complex but cannot be used
-            # for lamdification!
-            func1 = lambdify(var, expr,
-                            ({'DiracDelta' : dirac,
-                              'Heaviside' : heaviside,
-                              'UnitImpulse' : unitimpulse,
-                              'sqrt' : sqrt, 'exp' : exp},
-                             "scipy", "numpy", "math", "sympy"))
-
-            def func(arg):
+            def evaluate_vector(expr, var, arg):
+                # Evaluate for all the values at once.  Integers are
+                # converted to floats since NumPy does not support
+                # integers to negative integer powers.
+                arg = np.asarray(arg)
+                if arg.dtype.kind in 'biu':
+                    arg = arg.astype(float)
+
+                with np.errstate(all='ignore'):
+                    result = evaluate_lambdify(expr, var, True)(arg)
+                response = np.broadcast_to(result, arg.shape).astype(complex)
+
+                # Values for negative arguments may be invalid, say
+                # for (-1)**n, so mask them.
+                if is_causal and not np.iscomplexobj(arg):
+                    response[arg < 0] = 0
+                return response
+
+            def evaluate_scalar(func1, arg):
                 # Lambdify barfs on (-1)**n if for negative values of n.
                 # even if have (-1)**n * Heaviside(n)
                 # So this function heads Lambdify off at the pass,
                 # if the function is causal.
                 
                 if is_causal and arg < 0:
-                    return 0
-                return func1(arg)
+                    return complex(0)
+
+                try:
+                    return complex(func1(arg))
+                except NameError as e:
+                    raise RuntimeError('Cannot evaluate expression %s: %s' % (self, e))
+                except AttributeError as e:
+                    if False and expr.is_Piecewise:
+                        raise RuntimeError(
+                            'Cannot evaluate expression %s,'
+                            ' due to undetermined conditional result' % self)
 
-            try:
-                result = func(arg0)
-                response = complex(result)
-            except NameError as e:
-                raise RuntimeError('Cannot evaluate expression %s: %s' % (self, e))
-            except AttributeError as e:
-                if False and expr.is_Piecewise:
                     raise RuntimeError(
                         'Cannot evaluate expression %s,'
-                        ' due to undetermined conditional result' % self)
+                        ' probably have a mysterious function: %s' % (self, e))
 
-                raise RuntimeError(
-                    'Cannot evaluate expression %s,'
-                    ' probably have a mysterious function: %s' % (self, e))
+                except TypeError as e:
+                    raise RuntimeError('Cannot evaluate expression %s: %s' % (self, e))
 
-            except TypeError as e:
-                raise RuntimeError('Cannot evaluate expression %s: %s' % (self, e))
-            
             if scalar:
+                response = evaluate_scalar(evaluate_lambdify(expr, var), arg0)
                 if np.allclose(response.imag, 0.0):
                     response = response.real
                 return response
 
             try:
-                response = np.array([complex(func(arg0)) for arg0 in arg])
-            except TypeError:
-                raise TypeError(
-                    'Cannot evaluate expression %s,'
-                    ' probably have undefined symbols' % self)
+                response = evaluate_vector(expr, var, arg)
+            except Exception:
+                # Fall back on evaluating each element, say for
+                # functions that do not support arrays.
+                func1 = evaluate_lambdify(expr, var)
+                response = np.array([evaluate_scalar(func1, arg1)
+                                     for arg1 in arg])
 
             if np.allclose(response.imag, 0.0):
                 response = response.real
@@ -1223,6 +1330,75 @@ class Expr(ExprPrint, ExprMisc):
 
         return evaluate_expr(expr, var, arg)
 
+    def evaluate_grid(self, **values):
+        """Evaluate expression for arrays of values of its variable and
+        symbols, specified by name.  For example,
+
+        V.evaluate_grid(t=tv, R=Rv)
+
+        Each array has its own axis of the result, in the specified
+        order, so the result has shape (len(tv), len(Rv)).  Scalar
+        values do not have an axis.  All the symbols in the expression
+        need values.  The result is of type float or complex.
+        """
+
+        expr = self.expr
+
+        symbols = dict([(symbol.name, symbol) for symbol in expr.free_symbols])
+        if self.var is not None:
+            symbols[self.var.name] = self.var
+
+        undefined = set(symbols) - set(values)
+        if undefined != set():
+            raise ValueError('Undefined symbols %s in expression %s' % (tuple(undefined), self))
+
+        # Arrange the arrays along their own axes for broadcasting.
+        # Integers are converted to floats since NumPy does not
+        # support integers to negative integer powers.
+        arrays = [np.asarray(value) for value in values.values()]
+        arrays = [value.astype(float) if value.dtype.kind in 'biu' else value
+                  for value in arrays]
+        ndim = len([value for value in arrays if value.ndim > 0])
+        shape = []
+        args = []
+        for value in arrays:
+            if value.ndim > 0:
+                value = value.ravel()
+                value = value.reshape([1] * len(shape) + [len(value)] +
+                                      [1] * (ndim - len(shape) - 1))
+                shape.append(value.size)
+            args.append(value)
+
+        variables = tuple([symbols.get(name, sym.Symbol(name))
+                           for name in values])
+
+        try:
+            with np.errstate(all='ignore'):
+                result = evaluate_lambdify(expr, variables, True)(*args)
+            response = np.broadcast_to(result, shape).astype(complex)
+        except Exception:
+            # Fall back on evaluating for each combination of values,
+            # say for functions that do not support arrays.
+            func = np.vectorize(evaluate_lambdify(expr, variables),
+                                otypes=[complex])
+            try:
+                response = np.broadcast_to(func(*args), shape).copy()
+            except (TypeError, NameError, AttributeError) as e:
+                raise RuntimeError('Cannot evaluate expression %s: %s' % (self, e))
+
+        # Values for negative arguments may be invalid, say for
+        # (-1)**n, so mask them.
+        if self.is_causal and self.var.name in values:
+            arg = args[list(values).index(self.var.name)]
+            if not np.iscomplexobj(arg):
+                response[np.broadcast_to(arg < 0, shape)] = 0
+
+        if np.allclose(response.imag, 0.0):
+            response = response.real
+        if response.ndim == 0:
+            return response.item()
+        return response
+
     def has(self, *patterns):
         """Test whether any subexpressions matches any of the patterns.  For example,
          V.has(exp(t)) 
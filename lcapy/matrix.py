@@ -191,5 +191,153 @@ def matrix_inverse(M, method='default'):
 
     return M.inv(method=method)
 
+
+class MatrixSolution(object):
+    """This class solves M x = b for each element of x when it is first
+    indexed.  The factorisation of M is found once and shared by all
+    the elements.  If b has several columns, x[i, k] is the ith
+    element of the solution for the kth column of b.
+
+    With the 'LU' method, the LU factorisation of M and the forward
+    substitution are found when the object is created.  Each element
+    is then found by back substitution of just the elements it
+    depends upon.
+
+    With the 'cramer' method, det(M) is found when the object is
+    created.  Each element is then found using Cramer's rule as the
+    ratio of two determinants."""
+
+    def __init__(self, M, b, method='LU'):
+
+        self.M = M
+        self.b = b
+        self.method = method
+        self.cache = {}
+
+        if method == 'LU':
+            # This raises a ValueError if M is singular.
+            self.LU, perm = M.LUdecomposition_Simple(rankcheck=True)
+            b = b.permute_rows(perm)
+            self.y = [self._forward_substitute(b[:, k]) for k in range(b.cols)]
+        elif method == 'cramer':
+            self.det = M.det()
+            if self.det == 0:
+                raise ValueError('Matrix det == 0; not invertible.')
+        else:
+            raise ValueError('Unknown method ' + method)
+
+    def _forward_substitute(self, b):
+
+        LU = self.LU
+        y = []
+        for i in range(LU.rows):
+            value = b[i]
+            for j in range(i):
+                if LU[i, j] != 0:
+                    value -= LU[i, j] * y[j]
+            y.append(value)
+        return y
+
+    def _back_substitute(self, index, col):
+
+        LU = self.LU
+        cache = self.cache
+
+        # Find the elements that this element depends upon that
+        # have not been found.
+        needed = set()
+        stack = [index]
+        while stack != []:
+            i = stack.pop()
+            if i in needed or (i, col) in cache:
+                continue
+            needed.add(i)
+            for j in range(i + 1, LU.cols):
+                if LU[i, j] != 0:
+                    stack.append(j)
+
+        for i in sorted(needed, reverse=True):
+            value = self.y[col][i]
+            for j in range(i + 1, LU.cols):
+                if LU[i, j] != 0:
+                    value -= LU[i, j] * cache[j, col]
+            cache[i, col] = value / LU[i, i]
+
+    def __len__(self):
+
+        return self.M.shape[1]
+
+    def __getitem__(self, index):
+
+        if not isinstance(index, tuple):
+            index = (index, 0)
+
+        if index in self.cache:
+            return self.cache[index]
+
+        row, col = index
+        if self.method == 'LU':
+            self._back_substitute(row, col)
+        else:
+            Mk = self.M.copy()
+            Mk[:, row] = self.b[:, col]
+            self.cache[index] = Mk.det() / self.det
+        return self.cache[index]
+
+
+def matrix_solve(M, b, method='default'):
+    """Solve M x = b for x without finding the inverse of M (unless
+    method is 'inverse').
+
+    With the 'lazy-LU' and 'cramer' methods, a MatrixSolution object
+    is returned.  This finds each element of x when it is indexed."""
+
+    from .config import matrix_solve_method, matrix_solve_fallback_method
+
+    if method == 'default':
+        method = matrix_solve_method
+
+    if method == 'inverse':
+        return matrix_inverse(M) * b
+
+    elif method == 'lazy-LU':
+        return MatrixSolution(M, b, 'LU')
+
+    elif method == 'cramer':
+        return MatrixSolution(M, b, 'cramer')
+
+    elif method == 'FFLU':
+        # Fraction-free LU decomposition, P M = L D^-1 U.
+        P, L, D, U = M.LUdecompositionFF()
+        for n in range(U.rows):
+            if U[n, n] == 0:
+                raise ValueError('Matrix det == 0; not invertible.')
+        y = L.lower_triangular_solve(P * b)
+        return U.upper_triangular_solve(D * y).applyfunc(sym.cancel)
+
+    elif method == 'GE':
+        x, params = M.gauss_jordan_solve(b)
+        if params.shape[0] != 0:
+            raise ValueError('Matrix det == 0; not invertible.')
+        return x
+
+    elif method == 'DM-LU':
+        try:
+            # This is experimental.  The DomainMatrix needs to be
+            # over a field for the LU decomposition.
+            from sympy.polys.domainmatrix import DomainMatrix
+            dM = DomainMatrix.from_list_sympy(*M.shape, rows=M.tolist())
+            db = DomainMatrix.from_list_sympy(*b.shape, rows=b.tolist())
+            dM, db = dM.unify(db)
+            dM, db = dM.to_field(), db.to_field()
+            return dM.lu_solve(db).to_Matrix()
+        except:
+            method = matrix_solve_fallback_method
+
+    if method == 'LU':
+        return M.LUsolve(b)
+
+    raise ValueError('Unknown method ' + method)
+
     
 from .expr import Expr, expr
@@ -7,12 +7,18 @@ Copyright 2014--2019 Michael Hayes, UCECE
 from __future__ import division
 from .phasor import Iphasor, Vphasor
 from .vector import Vector
-from .matrix import Matrix, matrix_inverse
+from .matrix import Matrix, matrix_solve
 from .sym import symsimplify
 from .expr import ExprDict, expr
 from .voltage import Vtype
 from .current import Itype
 from .systemequations import SystemEquations
+from .sparsematrix import SparseStampMatrix, sparse_block_matrix
+from .sparsematrix import sparse_block_vector, sparse_solve
+from .sparsematrix import stamp_block_matrix, stamp_block_vector
+from .sparsematrix import SparseDescriptor, numeric_function
+from .sym import ssym
+import numpy as np
 import sympy as sym
 
 # Note, all the maths is performed using sympy expressions and the
@@ -20,7 +26,82 @@ import sympy as sym
 # efficient and, more importantly, overcomes some of the wrapping
 # problems which casues the is_real attribute to be dropped.
 
-class Nodedict(ExprDict):
+class LazyValue(object):
+
+    def __init__(self, func):
+        self.func = func
+
+
+class LazyExprDict(ExprDict):
+    """Dictionary where a value can be specified by a function, wrapped
+    in LazyValue, that is called when the value is first accessed."""
+
+    def __getitem__(self, key):
+
+        value = super(LazyExprDict, self).__getitem__(key)
+        if isinstance(value, LazyValue):
+            value = value.func()
+            super(LazyExprDict, self).__setitem__(key, value)
+        return value
+
+    def __iter__(self):
+
+        # Overriding this stops dict(self) from copying the raw values.
+        return iter(list(self.keys()))
+
+    def __eq__(self, other):
+
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+
+        return not self == other
+
+    def get(self, key, default=None):
+
+        if key in self:
+            return self[key]
+        return default
+
+    def items(self):
+
+        return [(key, self[key]) for key in list(self.keys())]
+
+    def values(self):
+
+        return [self[key] for key in list(self.keys())]
+
+    def pop(self, key, *args):
+
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return super(LazyExprDict, self).pop(key, *args)
+
+    def popitem(self, last=True):
+
+        key, value = super(LazyExprDict, self).popitem(last)
+        if isinstance(value, LazyValue):
+            value = value.func()
+        return key, value
+
+    def setdefault(self, key, default=None):
+
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+
+        # The values are not evaluated.
+        new = self.__class__()
+        for key, value in super(LazyExprDict, self).items():
+            super(LazyExprDict, new).__setitem__(key, value)
+        return new
+
+
+class Nodedict(LazyExprDict):
 
     def __getitem__(self, name):
         """Return node by name or number."""
@@ -31,9 +112,213 @@ class Nodedict(ExprDict):
         return super(Nodedict, self).__getitem__(name)
 
 
-class Branchdict(ExprDict):
+class Branchdict(LazyExprDict):
     pass
-    
+
+
+def policy_simplify(expr, policy):
+    """Simplify SymPy expression expr according to the simplification
+    policy: 'none', 'cancel', 'factor', or 'full'."""
+
+    if policy == 'none':
+        return expr
+    elif policy == 'cancel':
+        return sym.cancel(expr)
+    elif policy == 'factor':
+        return sym.factor(expr)
+    elif policy == 'full':
+        return symsimplify(expr)
+    raise ValueError('Unknown simplification policy %s' % policy)
+
+
+class MNAResults(object):
+    """Vector of MNA unknowns.  Each unknown is simplified, according
+    to the simplification policy, when it is first accessed."""
+
+    def __init__(self, solution, symbols, policy='full'):
+
+        self.solution = solution
+        self.symbols = symbols
+        self.policy = policy
+        self.cache = {}
+
+    def __getitem__(self, index):
+
+        if index not in self.cache:
+            value = policy_simplify(self.solution[index], self.policy)
+            self.cache[index] = value.subs(self.symbols)
+        return self.cache[index]
+
+
+class MNAColumn(object):
+    """Column `col` of the solution of the MNA equations for several
+    right hand sides."""
+
+    def __init__(self, solution, col):
+
+        self.solution = solution
+        self.col = col
+
+    def __getitem__(self, index):
+
+        return self.solution[index, self.col]
+
+
+class MNASharedSolution(object):
+    """This class solves the MNA equations for subnetlists that have the
+    same A matrix but different Z vectors, such as the subnetlists for
+    each noise source.  A is factored once and the Z vectors are
+    solved together as the columns of a matrix.  The subnetlists are
+    only analysed when one of them is first solved."""
+
+    def __init__(self, subs):
+
+        self.subs = subs
+        self.columns = {}
+        for col, sub in enumerate(subs):
+            self.columns[sub.kind] = col
+            sub._shared = self
+            # Update the stamps of the first subnetlist rather than
+            # generating them from scratch.
+            if col > 0 and sub._previous is None:
+                sub._previous = subs[0]
+
+    def system(self):
+        """Analyse the subnetlists and return the A matrix and the matrix
+        of Z vectors.  None is returned if the subnetlists do not have
+        the same A matrix."""
+
+        for sub in self.subs:
+            sub._analyse_symbolic()
+
+        A = self.subs[0]._A
+        for sub in self.subs[1:]:
+            if sub._A != A:
+                return None
+        return A, sym.Matrix.hstack(*[sub._Z for sub in self.subs])
+
+    def solve(self, sub):
+        """Return the vector of unknowns for subnetlist `sub`.  None is
+        returned if the subnetlists do not have the same A matrix."""
+
+        if not hasattr(self, 'solution'):
+            self.solution = None
+            system = self.system()
+            if system is not None:
+                try:
+                    self.solution = matrix_solve(*system)
+                except ValueError:
+                    raise sub._singular_error()
+
+        if self.solution is None:
+            return None
+        return MNAResults(MNAColumn(self.solution, self.columns[sub.kind]),
+                          sub.context.symbols, sub.simplify_policy)
+
+
+def mna_solve(A, Z, method='default'):
+    """Solve the MNA equations A X = Z and return a list of the
+    unknowns for each column of Z.  The unknowns are not simplified;
+    this is done when they are accessed.  A ValueError is raised if A
+    is singular.  This is called by the worker processes in
+    mna_solve_parallel."""
+
+    solution = matrix_solve(A, Z, method)
+    return [[solution[row, col] for row in range(Z.rows)]
+            for col in range(Z.cols)]
+
+
+def mna_solve_parallel(subs, processes=None):
+    """Solve the subnetlists `subs` concurrently using a pool of
+    `processes` worker processes.  If `processes` is None, the number
+    of CPUs is used.  Only the A matrices and Z vectors are sent to
+    the workers; the results are merged back into the subnetlists.
+    Subnetlists with a shared A matrix are solved by a single worker.
+
+    The workers are created with concurrent.futures.ProcessPoolExecutor.
+    With the spawn start method (the default on Windows and macOS),
+    each worker imports lcapy afresh and the calling script must guard
+    its main code with if __name__ == '__main__':."""
+
+    from concurrent.futures import ProcessPoolExecutor
+    from .config import mna_engine, matrix_solve_method
+
+    jobs = []
+    shared = []
+    for sub in subs:
+        results = None
+        if mna_engine == 'sparse':
+            # This is fast enough to be done here.
+            results = sub._solve_sparse()
+        elif mna_engine != 'symbolic':
+            raise ValueError('Unknown MNA engine %s' % mna_engine)
+        if results is not None:
+            sub._solve(results)
+        elif sub._shared is not None:
+            if hasattr(sub._shared, 'solution'):
+                sub._solve()
+            elif sub._shared not in shared:
+                shared.append(sub._shared)
+        else:
+            sub._analyse_symbolic()
+            jobs.append(([sub], sub._A, sub._Z))
+
+    for solution in shared:
+        system = solution.system()
+        if system is not None:
+            jobs.append((solution.subs, ) + system)
+        else:
+            jobs.extend([([sub], sub._A, sub._Z) for sub in solution.subs])
+
+    if len(jobs) < 2:
+        for job in jobs:
+            for sub in job[0]:
+                sub._solve()
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(mna_solve, A, Z, matrix_solve_method)
+                   for job_subs, A, Z in jobs]
+
+        for (job_subs, A, Z), future in zip(jobs, futures):
+            try:
+                columns = future.result()
+            except ValueError:
+                raise job_subs[0]._singular_error()
+            for sub, unknowns in zip(job_subs, columns):
+                # The unknowns are simplified when accessed.
+                sub._solve(MNAResults(unknowns, sub.context.symbols,
+                                      sub.simplify_policy))
+
+
+class MNAStamps(object):
+    """This class is a proxy for a netlist that redirects the element
+    stamps into the G, B, C, D, Is, and Es matrices it holds.  All
+    other attributes are looked up in the netlist."""
+
+    def __init__(self, cct, G, B, C, D, Is, Es):
+
+        self.cct = cct
+        self._G = G
+        self._B = B
+        self._C = C
+        self._D = D
+        self._Is = Is
+        self._Es = Es
+
+    def __getattr__(self, attr):
+
+        return getattr(self.cct, attr)
+
+
+def numeric_sympify(value):
+    """Convert a Python float or complex number to a SymPy number."""
+
+    value = complex(value)
+    if value.imag != 0:
+        return sym.Float(value.real) + sym.I * sym.Float(value.imag)
+    return sym.Float(value.real)
+
 
 class MNAMixin(object):
     """This class performs modified nodal analysis (MNA) on a netlist of
@@ -61,11 +346,27 @@ class MNAMixin(object):
 
     """
 
+    # Previously analysed netlist with the same kind.  Its MNA matrices
+    # are updated for the elements that have changed; see
+    # _stamps_update.
+    _previous = None
+
+    # Solution shared with other subnetlists that have the same A
+    # matrix; see MNASharedSolution.
+    _shared = None
+
     def _invalidate(self):
-        for attr in ('_A', '_Vdict', '_Idict'):
+        self._shared = None
+        for attr in ('_A', '_Asparse', '_results', '_Vdict', '_Idict',
+                     '_descriptor'):
             if hasattr(self, attr):
                 delattr(self, attr)
 
+    @property
+    def _is_analysed(self):
+
+        return hasattr(self, '_A') or hasattr(self, '_Asparse')
+
     def _node_index(self, node):
         """Return node index; ground is -1"""
         return self.node_list.index(self.node_map[node]) - 1
@@ -78,11 +379,8 @@ class MNAMixin(object):
         except ValueError:
             raise ValueError('Unknown component name %s for branch current' % cpt_name)
 
-    def _analyse(self):
-        """Analyse network."""
-
-        if hasattr(self, '_A'):
-            return
+    def _analyse_prepare(self):
+        """Check network and determine the unknown branch currents."""
 
         # Hack, to indirectly generate element list for network.
         if self.elements == {}:
@@ -105,21 +403,86 @@ class MNAMixin(object):
             if elt.need_extra_branch_current:
                 self.unknown_branch_currents.append(elt.name + 'X')
 
-        # Generate stamps.
-        num_nodes = len(self.node_list) - 1
-        num_branches = len(self.unknown_branch_currents)
+    def _stamps_update(self, previous, matrices, numeric=False):
+        """Update copies of the previous G, B, C, D, Is, and Es
+        matrices, specified by `matrices`, for netlist `previous` by
+        removing the stamps of the elements that have changed and
+        adding the stamps of their replacements.  The elements are
+        compared using their netlist strings.  None is returned if the
+        netlists have different nodes or unknown branch currents
+        since then the matrices have a different structure."""
+
+        if (previous.node_list != self.node_list or
+            previous.unknown_branch_currents != self.unknown_branch_currents):
+            return None
+
+        old_elements = previous.elements
+        new_elements = self.elements
+
+        changed = set()
+        for name in set(old_elements) | set(new_elements):
+            if (name not in old_elements or name not in new_elements or
+                str(old_elements[name]) != str(new_elements[name])):
+                changed.add(name)
+
+        # The stamps for mutual inductances depend on the inductors.
+        for elements in (old_elements, new_elements):
+            for elt in elements.values():
+                if elt.type == 'K' and (elt.Lname1 in changed or
+                                        elt.Lname2 in changed):
+                    changed.add(elt.name)
+
+        matrices = [M.copy() for M in matrices]
+        for cct, sign in ((previous, -1), (self, 1)):
+            for name in changed:
+                if name not in cct.elements:
+                    continue
+                stamps = MNAStamps(cct, *[SparseStampMatrix(*M.shape,
+                                                            numeric=numeric)
+                                          for M in matrices])
+                cct.elements[name]._stamp(stamps)
+
+                for M, S in zip(matrices, (stamps._G, stamps._B, stamps._C,
+                                           stamps._D, stamps._Is, stamps._Es)):
+                    for key, value in S.entries.items():
+                        M[key] += sign * value
+        return matrices
 
-        self._G = sym.zeros(num_nodes, num_nodes)
-        self._B = sym.zeros(num_nodes, num_branches)
-        self._C = sym.zeros(num_branches, num_nodes)
-        self._D = sym.zeros(num_branches, num_branches)
+    def _analyse(self):
+        """Analyse network.  If the netlist has been derived from a
+        previously analysed netlist, only the stamps for the elements
+        that have changed are updated."""
 
-        self._Is = sym.zeros(num_nodes, 1)
-        self._Es = sym.zeros(num_branches, 1)
+        if hasattr(self, '_A'):
+            return
 
-        # Iterate over circuit elements and fill in matrices.
-        for elt in self.elements.values():
-            elt._stamp(self)
+        self._analyse_prepare()
+
+        matrices = None
+        previous = self._previous
+        if previous is not None and hasattr(previous, '_A'):
+            matrices = self._stamps_update(previous,
+                                           (previous._G, previous._B,
+                                            previous._C, previous._D,
+                                            previous._Is, previous._Es))
+        if matrices is not None:
+            self._G, self._B, self._C, self._D, self._Is, self._Es = matrices
+        else:
+            # Generate stamps.
+            num_nodes = len(self.node_list) - 1
+            num_branches = len(self.unknown_branch_currents)
+
+            self._G = sym.zeros(num_nodes, num_nodes)
+            self._B = sym.zeros(num_nodes, num_branches)
+            self._C = sym.zeros(num_branches, num_nodes)
+            self._D = sym.zeros(num_branches, num_branches)
+
+            self._Is = sym.zeros(num_nodes, 1)
+            self._Es = sym.zeros(num_branches, 1)
+
+            # Iterate over circuit elements and fill in matrices.
+            for elt in self.elements.values():
+                elt._stamp(self)
 
         # Augment the admittance matrix to form A matrix.
         self._A = self._G.row_join(self._B).col_join(self._C.row_join(self._D))
@@ -127,46 +490,131 @@ class MNAMixin(object):
         # to form Z vector.
         self._Z = self._Is.col_join(self._Es)
 
-    def _solve(self):
-        """Solve network."""
-        
-        if hasattr(self, '_Vdict'):
+    def _analyse_sparse(self):
+        """Analyse network using sparse numerical matrices.  A
+        ValueError is raised if the network has a symbolic component
+        value."""
+
+        if hasattr(self, '_Asparse'):
             return
+
+        self._analyse_prepare()
+
+        matrices = None
+        previous = self._previous
+        if previous is not None and hasattr(previous, '_Asparse'):
+            matrices = self._stamps_update(previous, previous._sparse_stamps,
+                                           numeric=True)
+        if matrices is not None:
+            stamps = MNAStamps(self, *matrices)
+        else:
+            num_nodes = len(self.node_list) - 1
+            num_branches = len(self.unknown_branch_currents)
+
+            stamps = MNAStamps(self,
+                               SparseStampMatrix(num_nodes, num_nodes),
+                               SparseStampMatrix(num_nodes, num_branches),
+                               SparseStampMatrix(num_branches, num_nodes),
+                               SparseStampMatrix(num_branches, num_branches),
+                               SparseStampMatrix(num_nodes, 1),
+                               SparseStampMatrix(num_branches, 1))
+
+            for elt in self.elements.values():
+                elt._stamp(stamps)
+
+        self._sparse_stamps = (stamps._G, stamps._B, stamps._C, stamps._D,
+                               stamps._Is, stamps._Es)
+        self._Zsparse = sparse_block_vector(stamps._Is, stamps._Es)
+        self._Asparse = sparse_block_matrix(stamps._G, stamps._B,
+                                            stamps._C, stamps._D)
+
+    def _singular_error(self):
+
+        comment = ''
+        if self.kind == 'dc':
+            comment = '  Check there is a DC path between all nodes.'
+        return ValueError(
+"""The MNA A matrix is not invertible for %s analysis because:
+1. there may be capacitors in series;
+2. a voltage source might be short-circuited;
+3. a current source might be open-circuited;
+4. a dc current source is connected to a capacitor (use step current source).
+5. part of the circuit is not referenced to ground
+%s""" % (self.kind, comment))
+
+    def _analyse_symbolic(self):
+        """Analyse network and check that it can be solved symbolically."""
+
         self._analyse()
 
         if '0' not in self.node_map:
             raise RuntimeError('Cannot solve: nothing connected to ground node 0')
+
+    def _solve_symbolic(self):
+        """Solve network symbolically and return the vector of
+        unknowns.  Each unknown is simplified when it is first
+        accessed."""
+
+        if self._shared is not None:
+            results = self._shared.solve(self)
+            if results is not None:
+                return results
+
+        self._analyse_symbolic()
         
         # Solve for the nodal voltages
         try:
             # The default method, Gaussian elimination, is the fastest
             # but hangs on some matrices with sympy-1.6.1
             # Comparative times for the testsuites are:
-            # GE 66, ADJ 73, LU 76. 
-            Ainv = matrix_inverse(self._A)
+            # GE 66, ADJ 73, LU 76.  The method is selected by
+            # matrix_solve_method; by default the inverse of A is
+            # found.  With the cramer method, only det(A) is found
+            # here; each unknown is found when it is first accessed.
+            solution = matrix_solve(self._A, self._Z)
         except ValueError:
-            comment = ''
-            if self.kind == 'dc':
-                comment = '  Check there is a DC path between all nodes.'
-            raise ValueError(
-"""The MNA A matrix is not invertible for %s analysis because:
-1. there may be capacitors in series;
-2. a voltage source might be short-circuited;
-3. a current source might be open-circuited;
-4. a dc current source is connected to a capacitor (use step current source).
-5. part of the circuit is not referenced to ground
-%s""" % (self.kind, comment))
+            raise self._singular_error()
 
-        results = symsimplify(Ainv * self._Z)
+        return MNAResults(solution, self.context.symbols,
+                          self.simplify_policy)
 
-        results = results.subs(self.context.symbols)
+    def _solve_sparse(self):
+        """Solve network numerically using a sparse LU factorisation and
+        return the vector of unknowns.  None is returned if the network
+        has a symbolic component value."""
 
-        branchdict = {}
-        for elt in self.elements.values():
-            if elt.type == 'K' or elt.ignore:
-                continue
-            n1, n2 = self.node_map[elt.nodenames[0]], self.node_map[elt.nodenames[1]]
-            branchdict[elt.name] = (n1, n2)
+        try:
+            self._analyse_sparse()
+        except ValueError:
+            return None
+
+        if '0' not in self.node_map:
+            raise RuntimeError('Cannot solve: nothing connected to ground node 0')
+
+        try:
+            results = sparse_solve(self._Asparse, self._Zsparse)
+        except ValueError:
+            raise self._singular_error()
+
+        return [numeric_sympify(value) for value in results]
+
+    def _solve(self, results=None):
+        """Solve network.  If `results` is specified, it is used as the
+        vector of unknowns, say when found by another process."""
+        
+        if hasattr(self, '_Vdict'):
+            return
+
+        if results is None:
+            from .config import mna_engine
+
+            if mna_engine == 'sparse':
+                results = self._solve_sparse()
+            elif mna_engine != 'symbolic':
+                raise ValueError('Unknown MNA engine %s' % mna_engine)
+        if results is None:
+            results = self._solve_symbolic()
+        self._results = results
 
         vtype = Vtype(self.kind)
         itype = Itype(self.kind)
@@ -179,6 +627,35 @@ class MNAMixin(object):
                            'causal' : self.is_causal}
         elif isinstance(self.kind, str) and self.kind[0] == 'n':
             assumptions = {'nid' : self.kind}
+
+        policy = self.simplify_policy
+
+        def simplify(value):
+            # The unknowns have already been simplified according
+            # to the policy.
+            if policy == 'full':
+                return value.simplify()
+            return value
+
+        # The node voltages and branch currents are only found when
+        # they are first accessed.
+        def node_voltage(index):
+            return simplify(vtype(results[index], **assumptions))
+
+        def branch_current(index, negate):
+            I = results[index]
+            if negate:
+                I = -I
+            return simplify(itype(I, **assumptions))
+
+        def cpt_current(elt):
+            n1 = self.node_map[elt.nodenames[0]]
+            n2 = self.node_map[elt.nodenames[1]]                
+            V1, V2 = self._Vdict[n1], self._Vdict[n2]
+            I = (V1.expr - V2.expr - elt.V0) / elt.Z.expr
+            if policy in ('cancel', 'factor'):
+                I = policy_simplify(I, policy)
+            return simplify(itype(I, **assumptions))
        
         # Create dictionary of node voltages
         self._Vdict = Nodedict()
@@ -186,7 +663,8 @@ class MNAMixin(object):
         for n in self.nodes:
             index = self._node_index(n)
             if index >= 0:
-                self._Vdict[n] = vtype(results[index], **assumptions).simplify()
+                self._Vdict[n] = LazyValue(lambda index=index:
+                                           node_voltage(index))
             else:
                 self._Vdict[n] = vtype(0, **assumptions)
 
@@ -195,23 +673,153 @@ class MNAMixin(object):
         # Create dictionary of branch currents through elements
         self._Idict = Branchdict()
         for m, key in enumerate(self.unknown_branch_currents):
-            I = results[m + num_nodes]
-            if key in self.elements and self.elements[key].is_source:
-                I = -I
-            self._Idict[key] = itype(I, **assumptions).simplify()
+            negate = key in self.elements and self.elements[key].is_source
+            self._Idict[key] = LazyValue(lambda m=m, negate=negate:
+                                         branch_current(m + num_nodes, negate))
 
-        # Calculate the branch currents.  These should be lazily
-        # evaluated as required.
+        # Calculate the branch currents.
         for elt in self.elements.values():
             if elt.type in ('R', 'C'):
-                n1 = self.node_map[elt.nodenames[0]]
-                n2 = self.node_map[elt.nodenames[1]]                
-                V1, V2 = self._Vdict[n1], self._Vdict[n2]
-                I = (V1.expr - V2.expr - elt.V0) / elt.Z.expr
-                self._Idict[elt.name] = itype(I, **assumptions).simplify()
+                self._Idict[elt.name] = LazyValue(lambda elt=elt:
+                                                  cpt_current(elt))
             elif elt.type in ('I', ):
                 self._Idict[elt.name] = elt.Isc
 
+    def _analyse_descriptor(self):
+        """Analyse network in descriptor form for numerical analysis in
+        the s-domain.  The MNA matrices are stamped once and A is split
+        into A0 + s A1, where A0 and A1 are sparse numerical
+        matrices."""
+
+        if hasattr(self, '_descriptor'):
+            return
+
+        self._analyse_prepare()
+
+        num_nodes = len(self.node_list) - 1
+        num_branches = len(self.unknown_branch_currents)
+
+        stamps = MNAStamps(self,
+                           *[SparseStampMatrix(rows, cols, numeric=False)
+                             for rows, cols in ((num_nodes, num_nodes),
+                                                (num_nodes, num_branches),
+                                                (num_branches, num_nodes),
+                                                (num_branches, num_branches),
+                                                (num_nodes, 1),
+                                                (num_branches, 1))])
+
+        for elt in self.elements.values():
+            elt._stamp(stamps)
+
+        A = stamp_block_matrix(stamps._G, stamps._B, stamps._C, stamps._D)
+        Z = stamp_block_vector(stamps._Is, stamps._Es)
+        self._descriptor = SparseDescriptor(A, Z, ssym)
+
+    @property
+    def descriptor_matrices(self):
+        """Return the numerical matrices A0 and A1 of the descriptor form
+        of the MNA A matrix, A = A0 + s A1, as a tuple.  These are
+        often written as G and C.  A ValueError is raised if A is not
+        affine in s, say for a transfer function component."""
+
+        self._analyse_descriptor()
+        self._descriptor._check_affine()
+        return (Matrix(self._descriptor.A0.todense()),
+                Matrix(self._descriptor.A1.todense()))
+
+    def _poles(self):
+        """Numerically find the natural frequencies of the network from
+        the generalised eigenvalues of its descriptor form."""
+
+        if self.kind not in ('s', 'ivp', 'laplace'):
+            raise ValueError('Cannot find poles of %s netlist' % self.kind)
+
+        self._analyse_descriptor()
+        return self._descriptor.poles()
+
+    def _transfer_zeros(self, source, Np, Nm):
+        """Numerically find the zeros of the transfer function from the
+        voltage source named `source` to the voltage between nodes Np
+        and Nm."""
+
+        self._analyse_descriptor()
+
+        num_nodes = len(self.node_list) - 1
+        N = self._descriptor.shape[0]
+
+        b = np.zeros(N)
+        b[num_nodes + self._branch_index(source)] = 1
+
+        c = np.zeros(N)
+        for node, sign in ((Np, 1), (Nm, -1)):
+            index = self._node_index(node)
+            if index >= 0:
+                c[index] += sign
+        return self._descriptor.zeros(b, c)
+
+    def ac_sweep(self, fvector, outputs):
+        """Numerically evaluate the frequency response of node voltages
+        and branch currents for the frequencies (in Hz) in `fvector`.
+        This requires the netlist to be in the Laplace domain and have
+        numerical component values.
+
+        `outputs` is a list of node names, for node voltages, and
+        component names, for branch currents.  An array is returned
+        with a row for each output and a column for each frequency.
+        If `outputs` is a single name, a vector is returned.
+
+        The MNA matrices are stamped once and the equations are solved
+        for all the frequencies as a batch.  Unlike `frequency_response`,
+        no symbolic expressions are found."""
+
+        if self.kind not in ('s', 'ivp', 'laplace'):
+            raise ValueError('Cannot sweep %s netlist' % self.kind)
+
+        self._analyse_descriptor()
+
+        if '0' not in self.node_map:
+            raise RuntimeError('Cannot solve: nothing connected to ground node 0')
+
+        svector = 2j * np.pi * np.asarray(fvector, dtype=float).ravel()
+        try:
+            X = self._descriptor.solve(svector)
+        except ValueError:
+            raise self._singular_error()
+
+        num_nodes = len(self.node_list) - 1
+
+        def node_voltage(node):
+            index = self._node_index(node)
+            if index < 0:
+                return np.zeros(len(svector), dtype=complex)
+            return X[:, index]
+
+        def output(name):
+            if isinstance(name, int):
+                name = '%d' % name
+            if name in self.node_map:
+                return node_voltage(name)
+            if name in self.unknown_branch_currents:
+                I = X[:, num_nodes + self.unknown_branch_currents.index(name)]
+                if self.elements[name].is_source:
+                    I = -I
+                return I
+            if name not in self.elements:
+                raise ValueError('Unknown node or component %s' % name)
+
+            elt = self.elements[name]
+            if elt.type in ('R', 'C'):
+                V = (node_voltage(elt.nodenames[0]) -
+                     node_voltage(elt.nodenames[1]))
+                return numeric_function(elt.Y.expr, ssym)(svector) * V
+            elif elt.type in ('I', ):
+                return numeric_function(elt.Isc.expr, ssym)(svector)
+            raise ValueError('Cannot determine current through %s' % name)
+
+        if not isinstance(outputs, (list, tuple)):
+            return output(outputs)
+        return np.array([output(name) for name in outputs])
+
     @property
     def A(self):
         """Return A matrix for MNA"""
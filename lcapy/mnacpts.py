@@ -12,7 +12,7 @@ from .cexpr import cExpr
 from .omegaexpr import omegaExpr
 from .symbols import j, omega, jomega, s, t
 from .functions import sqrt
-from .sym import capitalize_name, omegasym
+from .sym import capitalize_name, omegasym, ssym, fsym
 from .grammar import delimiters
 from .immitance import ImmitanceMixin
 from .current import Current
@@ -1068,6 +1068,11 @@ class K(Dummy):
                                  cpt_type, cpt_id, string,
                                  opts_string, nodes, keyword, *args)
 
+    def _r_model(self):
+        # The mutual inductance is handled by the companion models of
+        # the coupled inductors.
+        return ''
+
     def _stamp(self, cct):
 
         if cct.kind == 'dc':
@@ -1087,7 +1092,7 @@ class K(Dummy):
         if cct.kind in ('s', 'ivp', 'laplace'):
             # FIXME, generalise for other domains...
             # The Impedance class really needs fixing.
-            ZM = K.expr * sym.sqrt(ZL1 * ZL2 / s**2) * s
+            ZM = K.expr * sym.sqrt(ZL1 * ZL2 / ssym**2) * ssym
         else:
             ZM = K.expr * sym.sqrt(ZL1 * ZL2)
             
@@ -1455,12 +1460,22 @@ class Y(RC):
 
     reactive = True
 
+    def _r_model(self):
+
+        # A frequency independent impedance is a resistance.
+        Z = self.Z.expr
+        if Z.has(ssym, omegasym, fsym):
+            return self._copy()
+        return self._netmake_variant('R', args=Z)
+
 
 class Z(RC):
     """Impedance"""
 
     reactive = True    
 
+    _r_model = Y._r_model
+
 
 classes = {}
 
@@ -15,7 +15,8 @@ from .symbols import j, s, omega
 from .voltage import Voltage, Vname
 from .current import Current, Iname
 from .schematic import Schematic
-from .mna import MNAMixin, Nodedict, Branchdict
+from .mna import MNAMixin, Nodedict, Branchdict, MNASharedSolution
+from .mna import mna_solve_parallel
 from .statespace import StateSpace
 from .simulator import Simulator
 from .netfile import NetfileMixin
@@ -209,6 +210,7 @@ class NetlistMixin(object):
         
         self.context = context
         self.allow_anon = allow_anon
+        self._simplify_policy = None
         self._init_parser(mnacpts, allow_anon=allow_anon)
 
         if filename is not None:
@@ -271,6 +273,26 @@ class NetlistMixin(object):
         symbols.update(state.global_context.symbols)
         return symbols
     
+    @property
+    def simplify_policy(self):
+        """Return simplification policy for the analysis results.  This
+        can be 'none', 'cancel', 'factor', or 'full'.  If it has not
+        been set, config.simplify_policy is used."""
+
+        if self._simplify_policy is not None:
+            return self._simplify_policy
+
+        from .config import simplify_policy
+        return simplify_policy
+
+    @simplify_policy.setter
+    def simplify_policy(self, policy):
+
+        if policy not in (None, 'none', 'cancel', 'factor', 'full'):
+            raise ValueError('Unknown simplification policy %s' % policy)
+        self._invalidate()
+        self._simplify_policy = policy
+
     @property
     def elements(self):
 
@@ -344,9 +366,12 @@ class NetlistMixin(object):
         # TODO.  Copy or share?
         context = self.context
         if self.__class__ == 'Circuit':
-            return Circuit(context=context)
-        # If have OnePort, Network, etc., treat as Netlist
-        return Netlist(context=context)
+            new = Circuit(context=context)
+        else:
+            # If have OnePort, Network, etc., treat as Netlist
+            new = Netlist(context=context)
+        new._simplify_policy = self._simplify_policy
+        return new
 
     def remove(self, name):
         """Remove specified element or elements specified in list."""
@@ -765,16 +790,62 @@ class NetlistMixin(object):
 
         N1p, N1m, N2p, N2m = self._check_nodes(N1p, N1m, N2p, N2m)
         
+        new = self._transfer_netlist(N1p, N1m)
+
+        V2 = new.Voc(N2p, N2m)
+        V1 = new.V1_.V
+
+        return Hs(V2.laplace() / V1.laplace(), causal=True)
+
+    def _transfer_netlist(self, N1p, N1m):
+        """Create netlist with the independent sources killed and the
+        voltage source V1_ connected between nodes N1p and N1m."""
+
         new = self.kill()
         if '0' not in new.nodes:
             new.add('W %s 0' % N1m)
         
         new._add('V1_ %s %s {DiracDelta(t)}' % (N1p, N1m))
+        return new
 
-        V2 = new.Voc(N2p, N2m)
-        V1 = new.V1_.V
+    def transfer_poles(self, N1p, N1m, N2p, N2m):
+        """Numerically find the poles of the s-domain voltage transfer
+        function V2(s) / V1(s) created by `transfer`.  These are
+        returned as an array sorted by real part.
 
-        return Hs(V2.laplace() / V1.laplace(), causal=True)
+        The poles are found from the generalised eigenvalues of the
+        descriptor form of the MNA equations, A0 + s A1, rather than
+        symbolically.  This requires numerical component values.
+        Note, poles that cancel with zeros are not removed."""
+
+        N1p, N1m, N2p, N2m = self._check_nodes(N1p, N1m, N2p, N2m)
+        return self._transfer_netlist(N1p, N1m).laplace()._poles()
+
+    def transfer_zeros(self, N1p, N1m, N2p, N2m):
+        """Numerically find the zeros of the s-domain voltage transfer
+        function V2(s) / V1(s) created by `transfer`.  These are
+        returned as an array sorted by real part.
+
+        The zeros are found from the generalised eigenvalues of the
+        system matrix formed from the descriptor form of the MNA
+        equations, A0 + s A1, rather than symbolically.  This
+        requires numerical component values.  Note, zeros that cancel
+        with poles are not removed."""
+
+        N1p, N1m, N2p, N2m = self._check_nodes(N1p, N1m, N2p, N2m)
+        sub = self._transfer_netlist(N1p, N1m).laplace()
+        return sub._transfer_zeros('V1_', N2p, N2m)
+
+    def poles(self):
+        """Numerically find the natural frequencies (poles) of the
+        circuit with the independent sources killed.  These are
+        returned as an array sorted by real part.
+
+        The poles are found from the generalised eigenvalues of the
+        descriptor form of the MNA equations, A0 + s A1, rather than
+        symbolically.  This requires numerical component values."""
+
+        return self.kill().laplace()._poles()
 
     def Aparams(self, N1p, N1m, N2p, N2m):
         """Create A-parameters for two-port defined by nodes N1p, N1m, N2p, and N2m, where:
@@ -1693,8 +1764,14 @@ class Netlist(NetlistMixin, NetfileMixin):
 
     def _invalidate(self):
 
+        # Keep the subnetlists so that their MNA matrices can be
+        # updated, rather than rebuilt, when the netlist is modified.
+        if hasattr(self, '_sub'):
+            self._sub_previous = self._sub
+
         for attr in ('_sch', '_sub', '_Vdict', '_Idict', '_analysis',
-                     '_node_map', '_ss', '_node_list', '_branch_list'):
+                     '_node_map', '_ss', '_node_list', '_branch_list',
+                     '_sweep_sub'):
             try:
                 delattr(self, attr)
             except:
@@ -1741,8 +1818,29 @@ class Netlist(NetlistMixin, NetfileMixin):
         groups = self._groups()
         self._sub = Transformdomains()
 
+        previous_subs = {}
+        if hasattr(self, '_sub_previous'):
+            previous_subs = self._sub_previous
+            del self._sub_previous
+
         for kind, sources in groups.items():
-            self._sub[kind] = SubNetlist(self, kind)
+            sub = SubNetlist(self, kind)
+            if kind in previous_subs:
+                previous = previous_subs[kind]
+                if not previous._is_analysed:
+                    previous = previous._previous
+                elif previous is not None:
+                    # Only keep one generation.
+                    previous._previous = None
+                sub._previous = previous
+            self._sub[kind] = sub
+
+        # The noise subnetlists have the same A matrix so they can be
+        # solved together.
+        noise_subs = [sub for kind, sub in self._sub.items()
+                      if isinstance(kind, str) and kind[0] == 'n']
+        if len(noise_subs) > 1:
+            MNASharedSolution(noise_subs)
 
         return self._sub
         
@@ -1768,6 +1866,19 @@ class Netlist(NetlistMixin, NetfileMixin):
         """Return list of transform domain kinds."""
         return list(self.sub.keys())
     
+    def _solve_subs(self):
+        """Solve the subnetlists concurrently if config.mna_processes is
+        not 1."""
+
+        from .config import mna_processes
+
+        if mna_processes == 1:
+            return
+
+        subs = [sub for sub in self.sub.values() if not hasattr(sub, '_Vdict')]
+        if len(subs) > 1:
+            mna_solve_parallel(subs, mna_processes)
+
     @property
     def Vdict(self):
         """Return dictionary of node voltages for each transform domain"""
@@ -1777,6 +1888,8 @@ class Netlist(NetlistMixin, NetfileMixin):
         except AttributeError:
             pass        
 
+        self._solve_subs()
+
         result = Nodedict()
         for sub in self.sub.values():
             for node, value in sub.Vdict.items():
@@ -1796,6 +1909,8 @@ class Netlist(NetlistMixin, NetfileMixin):
         except AttributeError:        
             pass
 
+        self._solve_subs()
+
         result = Branchdict()
         for sub in self.sub.values():
             for node, value in sub.Idict.items():
@@ -1808,6 +1923,8 @@ class Netlist(NetlistMixin, NetfileMixin):
     def get_I(self, name):
         """Current through component"""
 
+        self._solve_subs()
+
         result = Current()
         for sub in self.sub.values():
             I = sub.get_I(name)
@@ -1823,6 +1940,8 @@ class Netlist(NetlistMixin, NetfileMixin):
     def _get_Vd(self, Np, Nm=None):
         """This does not check nodes."""
         
+        self._solve_subs()
+
         result = Voltage()
         for sub in self.sub.values():
             Vd = sub.get_Vd(Np, Nm)
@@ -1877,6 +1996,36 @@ class Netlist(NetlistMixin, NetfileMixin):
         
         """        
         return SubNetlist(self, 'laplace')    
+
+    def ac_sweep(self, fvector, outputs):
+        """Numerically evaluate the frequency response of node voltages
+        and branch currents for the frequencies (in Hz) in `fvector`
+        using the Laplace representations of the independent sources.
+        This requires numerical component values.
+
+        `outputs` is a list of node names, for node voltages, and
+        component names, for branch currents.  An array is returned
+        with a row for each output and a column for each frequency.
+        If `outputs` is a single name, a vector is returned.
+
+        For example, cct.ac_sweep(f, [2, 'R1']) is the numerical
+        equivalent of evaluating cct[2].V(s).frequency_response(f) and
+        cct.R1.I(s).frequency_response(f) but avoids finding symbolic
+        expressions.  The MNA matrices are only stamped once for
+        repeated sweeps.  Initial value problems are not supported
+        since the frequency response does not depend on the initial
+        conditions.
+
+        See also, laplace.
+        """
+
+        if self.is_ivp:
+            raise ValueError('Cannot sweep netlist with initial conditions'
+                             ' for %s' % ', '.join(self.ics))
+
+        if not hasattr(self, '_sweep_sub'):
+            self._sweep_sub = self.laplace()
+        return self._sweep_sub.ac_sweep(fvector, outputs)
     
     
 class SubNetlist(NetlistMixin, MNAMixin):
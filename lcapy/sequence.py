@@ -4,7 +4,9 @@ Copyright 2020 Michael Hayes, UCECE
 
 """
 
-from .expr import ExprList, expr
+from .expr import ExprList, Expr, expr
+from sympy import Basic, Float, I
+import numpy as np
 
 # Perhaps subclass numpy ndarray?  But then could not have symbolic
 # elements in the sequence.  Perhaps have flavours for n-domain and
@@ -14,6 +16,11 @@ class Sequence(ExprList):
 
     def __init__(self, seq, n=None, evaluate=False, var=None):
 
+        # Keep floating point values as floats, otherwise they are
+        # converted to rationals.  Sequences with floats are filtered
+        # numerically.
+        seq = [_float(item) for item in seq]
+
         super (Sequence, self).__init__(seq, evaluate)
 
         if n is None:
@@ -40,9 +47,22 @@ class Sequence(ExprList):
     
     def __getitem__(self, n):
         """Note this returns the element with index matching n.
-        This is not necessarily the nth element in the sequence."""
-
-        # TODO, support slices, etc.
+        This is not necessarily the nth element in the sequence.
+
+        For a slice, the sequence of elements with indices in the
+        slice is returned.  For example, if seq = {_1, 2, 3, 4}
+        seq[1:3] = {2, 3}."""
+
+        if isinstance(n, slice):
+            start = self.n[0] if n.start is None else n.start
+            step = 1 if n.step is None else n.step
+            nvals = [n1 for n1 in self.n if n1 >= start and
+                     (n.stop is None or n1 < n.stop) and
+                     (n1 - start) % step == 0]
+            vals = [self[n1] for n1 in nvals]
+            return self.__class__(vals, nvals, var=self.var)
+
+        # TODO, support lists, etc.
         try:
             nindex = self.n.index(n)
         except ValueError:
@@ -86,6 +106,28 @@ class Sequence(ExprList):
         n = self.n + list(range(self.n[-1] + 1, len(vals)))
         return self.__class__(vals, n=n, var=self.var)        
     
+    def _combine(self, x, op):
+
+        if not isinstance(x, Sequence):
+            raise TypeError('Expecting Sequence, not %s' % type(x).__name__)
+
+        nvals = list(self.n) + list(x.n)
+        if nvals != []:
+            nvals = list(range(min(nvals), max(nvals) + 1))
+        vals = [op(self[n1], x[n1]) for n1 in nvals]
+        return self.__class__(vals, nvals, var=self.var or x.var)
+
+    def __add__(self, x):
+        """Add sequences element by element, aligning their indices."""
+
+        return self._combine(x, lambda a, b: a + b)
+
+    def __sub__(self, x):
+        """Subtract sequences element by element, aligning their
+        indices."""
+
+        return self._combine(x, lambda a, b: a - b)
+    
     def latex(self):
 
         items = []
@@ -227,12 +269,19 @@ class Sequence(ExprList):
         for the numerator and a `a` vector of coefficients for the
         denominator.
 
-        For a FIR filter a = [1]."""
+        For a FIR filter a = [1].
+
+        If the sequence and the coefficients are all numbers, the
+        filtering is performed numerically using SciPy."""
 
         if b is None:
             b = []
         if a is None:
             a = [1]
+
+        y = self._lfilter_numeric(b, a)
+        if y is not None:
+            return self.__class__(y, n=self.n, var=self.var)
         
         x = self.vals
         y = []
@@ -243,22 +292,67 @@ class Sequence(ExprList):
             y.append(expr(0))
             
             for m, b1 in enumerate(b):
-                try:
+                if n - m >= 0:
                     y[-1] += b1 * x[n - m] / a0
-                except:
-                    pass                
 
             yn = y[-1]
             for m, a1 in enumerate(a[1:]):
-                try:
-                    yn += a1 * y[-m - 2] / a0
-                except:
-                    pass
+                if n - m - 1 >= 0:
+                    yn -= a1 * y[-m - 2] / a0
             y[-1] = yn
                 
         #n = self.n + list(range(self.n[-1] + 1, len(y)))
         n = self.n
         return self.__class__(y, n=n, var=self.var)
+
+    def _lfilter_numeric(self, b, a):
+        """Filter sequence using SciPy if the sequence and the
+        coefficients are all numbers and the result does not need
+        exact arithmetic, otherwise return None.
+
+        SciPy is used if any of the numbers are floating point or for
+        an FIR filter with integer values."""
+
+        from scipy.signal import convolve, lfilter
+
+        floating = _has_float(self) or _has_float(b) or _has_float(a)
+
+        x, b, a = [[expr(val).expr for val in vals]
+                   for vals in (self.vals, b, a)]
+        vals = x + b + a
+        if not all(val.is_number for val in vals):
+            return None
+
+        if (all(val.is_Integer for val in vals) and len(a) == 1
+            and abs(a[0]) == 1):
+            if len(b) == 0 or len(x) == 0:
+                return [0] * len(x)
+
+            x = np.array([int(val) for val in x], dtype=object)
+            b = np.array([int(val) for val in b], dtype=object) * int(a[0])
+            # Avoid overflow.
+            if abs(x).max() * abs(b).sum() < 2**62:
+                x = x.astype(np.int64)
+                b = b.astype(np.int64)
+
+                # This chooses between direct and FFT convolution.  The
+                # result is exact for integer sequences.
+                return convolve(x, b)[0:len(x)].tolist()
+
+        if not floating:
+            return None
+        if len(b) == 0 or len(x) == 0:
+            return [0] * len(x)
+
+        x, b, a = _numeric_array(x), _numeric_array(b), _numeric_array(a)
+        if x is None or b is None or a is None:
+            return None
+
+        if len(a) == 1:
+            y = convolve(x, b / a[0])[0:len(x)]
+        else:
+            y = lfilter(b, a, x)
+        return y.tolist()
     
     def convolve(self, h, mode='full'):
         """Convolve with h."""
@@ -279,3 +373,39 @@ class Sequence(ExprList):
         
         return x.lfilter(h, a=[1])
     
+
+
+def _float(val):
+    """Convert floating point val to a SymPy float."""
+
+    if isinstance(val, (float, np.floating)):
+        return Float(val)
+    if isinstance(val, (complex, np.complexfloating)):
+        return Float(val.real) + I * Float(val.imag)
+    return val
+
+
+def _has_float(vals):
+    """Return True if any of vals are floating point numbers."""
+
+    for val in vals:
+        if isinstance(val, (float, complex, np.inexact)):
+            return True
+        if isinstance(val, Expr):
+            val = val.expr
+        if isinstance(val, Basic) and val.has(Float):
+            return True
+    return False
+
+
+def _numeric_array(vals):
+    """Convert vals to a floating point NumPy array, otherwise return
+    None."""
+
+    try:
+        vals = np.array([complex(val) for val in vals])
+    except TypeError:
+        return None
+    if np.all(vals.imag == 0):
+        vals = vals.real
+    return vals
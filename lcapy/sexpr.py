@@ -168,6 +168,58 @@ class sExpr(Expr):
         H = self.__class__(self / self.var, **self.assumptions)
         return H.transient_response(tvector)
 
+    @property
+    def _numeric_ratfun(self):
+        """Return the numerator and denominator polynomial coefficients
+        as arrays and the delay if the expression is a rational function
+        with numerical coefficients multiplied by a delay, otherwise
+        return None.  These are found once."""
+
+        try:
+            return self.__numeric_ratfun
+        except:
+            pass
+
+        self.__numeric_ratfun = None
+        try:
+            N, D, delay, undef = self._ratfun.as_ratfun_delay_undef()
+            if undef != 1:
+                return None
+            Nc, Dc = [np.array([complex(c) for c in Poly(P, self.var).all_coeffs()])
+                      for P in (N, D)]
+            delay = float(delay)
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+        # Normalise the coefficients to avoid overflow for high order
+        # polynomials.
+        scale = abs(Dc).max()
+        self.__numeric_ratfun = Nc / scale, Dc / scale, delay
+        return self.__numeric_ratfun
+
+    def _numeric_response(self, svector):
+        """Evaluate the expression at the complex values `svector` using
+        the polynomial coefficients of the rational function.  None is
+        returned if the expression is not a rational function with
+        numerical coefficients (multiplied by a delay)."""
+
+        ratfun = self._numeric_ratfun
+        if ratfun is None:
+            return None
+        Nc, Dc, delay = ratfun
+
+        svector = np.asarray(svector)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            response = np.polyval(Nc, svector) / np.polyval(Dc, svector)
+        if delay != 0:
+            response *= np.exp(-svector * delay)
+
+        if np.allclose(response.imag, 0.0):
+            response = response.real
+        if response.ndim == 0:
+            return response.item()
+        return response
+
     def angular_frequency_response(self, wvector=None):
         """Convert to angular frequency domain and evaluate response if
         angular frequency vector specified.
@@ -175,6 +227,11 @@ class sExpr(Expr):
         """
         from .symbols import omega        
 
+        if wvector is not None:
+            response = self._numeric_response(1j * np.asarray(wvector))
+            if response is not None:
+                return response
+
         X = self.subs(j * omega)
 
         if wvector is None:
@@ -182,68 +239,121 @@ class sExpr(Expr):
 
         return X.evaluate(wvector)
 
-    def frequency_response(self, fvector=None):
+    def frequency_response(self, fvector=None, **values):
         """Convert to frequency domain and evaluate response if frequency
-        vector specified.
+        vector specified.  Arrays of values for the other symbols can
+        be specified by name, for example,
+
+        H.frequency_response(fv, R=Rv)
+
+        The result then has an axis for the frequencies and an axis
+        for each array of values, see evaluate_grid.
+
+        For a rational function with numerical coefficients (and a
+        delay), the response is found from the polynomial coefficients
+        rather than by substitution.
 
         """
         from .symbols import f        
 
+        if fvector is not None and values == {}:
+            response = self._numeric_response(2j * np.pi * np.asarray(fvector))
+            if response is not None:
+                return response
+
         X = self.subs(j * 2 * pi * f)
 
         if fvector is None:
             return X
 
+        if values != {}:
+            return X.evaluate_grid(f=fvector, **values)
         return X.evaluate(fvector)
 
-    def response(self, x, t):
-        """Evaluate response to input signal x at times t."""
+    def response(self, x, t, method='fft'):
+        """Evaluate response to input signal x at times t.  The times
+        must be equally spaced.
+
+        The response of the strictly proper rational part is found
+        using the specified method:
+        'convolve' for direct convolution with the impulse response,
+        'fft' for convolution with the impulse response using FFTs,
+        'lsim' for filtering with a discrete-time model of the
+        rational part using a first-order hold of the input.  This
+        requires numerical coefficients but does not require the
+        inverse Laplace transform.
+
+        Direct convolution is O(N^2) for N samples so 'fft' or 'lsim'
+        should be used for long input signals."""
+
+        x = np.asarray(x, dtype=float)
+        t = np.asarray(t, dtype=float)
 
         if len(x) != len(t):
             raise ValueError('x must have same length as t')
 
         dt = t[1] - t[0]
         if not np.allclose(np.diff(t), np.ones(len(t) - 1) * dt):
-            raise (ValueError, 't values not equally spaced')
+            raise ValueError('t values not equally spaced')
+
+        if method not in ('convolve', 'fft', 'lsim'):
+            raise ValueError('Unknown method %s' % method)
 
         # Perform polynomial long division so expr = Q + M / D                
         N, D, delay = self._decompose()
-        Q, M = div(N, D)
-        expr = M / D
-
-        N = len(t)
+        Q, M = div(N, D, self.var)
+
+        if M == 0:
+            y = np.zeros(len(t))
+        elif method == 'lsim':
+            from scipy.signal import cont2discrete, lfilter
+
+            try:
+                Mc = [float(c) for c in Poly(M, self.var).all_coeffs()]
+                Dc = [float(c) for c in Poly(D, self.var).all_coeffs()]
+            except TypeError:
+                raise ValueError('Expression %s has non-numerical coefficients' % self)
+
+            # Filter the input without its initial value (so that it
+            # starts from rest) then add the (exact) step response
+            # for the initial value.
+            numd, dend, dtd = cont2discrete((Mc, Dc), dt, method='foh')
+            y = lfilter(numd.squeeze(), dend, x - x[0])
+            numd, dend, dtd = cont2discrete((Mc, Dc), dt, method='zoh')
+            y += x[0] * lfilter(numd.squeeze(), dend, np.ones(len(t)))
+        else:
+            from scipy.signal import fftconvolve
 
-        # Evaluate transient response.
-        th = np.arange(N) * dt - dt
-        h = sExpr(expr).transient_response(th)
+            # Evaluate transient response.
+            th = np.arange(len(t)) * dt
+            h = sExpr(M / D).transient_response(th)
 
-        print('Convolving...')
-        ty = t
-        y = np.convolve(x, h)[0:N] * dt
+            if method == 'fft':
+                y = fftconvolve(x, h)[0:len(t)]
+            else:
+                y = np.convolve(x, h)[0:len(t)]
+            # Use the trapezoidal rule for the convolution integral.
+            y = (y - 0.5 * (x[0] * h + x * h[0])) * dt
 
-        if Q:
+        if Q != 0:
             # Handle Dirac deltas and their derivatives.
-            C = Q.all_coeffs()
-            for n, c in enumerate(C):
+            C = Poly(Q, self.var).all_coeffs()
+            for c in reversed(C):
 
-                y += c * x
+                y += float(c) * x
 
                 x = np.diff(x) / dt
                 x = np.hstack((x, 0))
 
-        from scipy.interpolate import interp1d
-
-        if delay != 0.0:
-            print('Interpolating...')
+        if delay != 0:
             # Try linear interpolation; should oversample first...
-            y = interp1d(ty, y, bounds_error=False, fill_value=0)
-            y = y(t - delay)
+            y = np.interp(t - float(delay), t, y, left=0, right=0)
 
         return y
 
     def _decompose(self):
 
-        N, D, delay = Ratfun(self, s).as_ratfun_delay()                
+        N, D, delay = Ratfun(self.expr, self.var).as_ratfun_delay()                
 
         return N, D, delay
 
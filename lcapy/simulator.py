@@ -4,9 +4,23 @@ This module implements an experimental time-stepping simulation.
 Copyright 2020 Michael Hayes, UCECE
 """
 
-from numpy import zeros, array, float, linalg, dot
+from numpy import zeros, array, diag, where, asarray, interp, isclose
+from numpy import diff, eye, isinf, sign
+from numpy.lib.format import open_memmap
+from os import replace
+from math import factorial, sqrt
+from scipy.linalg import lu_factor, lu_solve, expm, solve
+from scipy.sparse.linalg import splu
+from sympy import zeros as zeros_matrix, Matrix
+from sympy.utilities.lambdify import lambdify
 from .sym import tsym, symbol_map
+from .cexpr import cExpr
 from .symbols import oo
+from .mna import MNAStamps
+from .expr import _evaluate_array_dirac, _evaluate_array_heaviside
+from .expr import _evaluate_array_unitimpulse
+from .sparsematrix import SparseStampMatrix, stamp_block_matrix
+from .sparsematrix import stamp_block_vector
 
 __all__ = ('Simulator', )
 
@@ -16,14 +30,139 @@ __all__ = ('Simulator', )
 # fewer nodes are needed and so the matrices are smaller.
 
 # TODO:
-# 1. handle initial values
-# 2. offset correction
+# 1. offset correction
+
+
+# Fraction of the time step for the trapezoidal step of TR-BDF2.  This
+# value makes the A matrices for both steps the same.
+TRBDF2_gamma = 2 - sqrt(2)
+
+
+def sources_lambdify(Zsym, params=None):
+    """Return a function that evaluates the MNA Z vector `Zsym`, a
+    function of t, at the times in an array.  Each element is
+    lambdified once.  The function returns an array with a row for
+    each element and a column for each time.
+
+    For a sweep, `params` is a dictionary of arrays of values for
+    symbols in `Zsym` and the array has a third axis for these
+    values."""
+
+    symbols = [tsym]
+    if params is not None:
+        symbols += list(params)
+
+    undefined = Zsym.free_symbols - set(symbols)
+    if undefined != set():
+        raise ValueError('Undefined symbols %s in Z vector; use subs to replace with numerical values' % undefined)
+
+    constants = {}
+    funcs = {}
+    for m, value in enumerate(Zsym):
+        if value == 0:
+            continue
+        if value.free_symbols == set():
+            constants[m] = float(value)
+            continue
+        funcs[m] = lambdify(symbols, value,
+                            ({'DiracDelta' : _evaluate_array_dirac,
+                              'Heaviside' : _evaluate_array_heaviside,
+                              'UnitImpulse' : _evaluate_array_unitimpulse},
+                             'numpy'))
+
+    def evaluate(tv):
+        tv = asarray(tv, dtype=float)
+        if params is None:
+            args = [tv]
+            shape = (Zsym.shape[0], len(tv))
+        else:
+            args = [tv[:, None]] + [values[None, :]
+                                    for values in params.values()]
+            shape = (Zsym.shape[0], len(tv), len(args[1][0]))
+        Z = zeros(shape)
+        for m, value in constants.items():
+            Z[m] = value
+        for m, func in funcs.items():
+            Z[m] = func(*args)
+        return Z
+
+    return evaluate
+
+
+def sources_evaluate(Zsym, tv):
+    """Evaluate the MNA Z vector `Zsym`, a function of t, at the times
+    in the array `tv`.  Each element is lambdified once and evaluated
+    for all the times.  An array is returned with a row for each
+    element and a column for each time."""
+
+    return sources_lambdify(Zsym)(tv)
+
+
+def _ideal_limit(A):
+    """Replace each row of the numeric A matrix that has infinite
+    entries, say for an ideal opamp with an infinite gain, by its limit
+    when divided by the gain.  The infinite entries become +1 or -1 and
+    the other entries become zero.  `A` is either an array or a
+    SparseStampMatrix."""
+
+    if isinstance(A, SparseStampMatrix):
+        rows = set([row for (row, col), value in A.entries.items()
+                    if isinf(value)])
+        for key, value in list(A.entries.items()):
+            if key[0] in rows:
+                A[key] = sign(value) if isinf(value) else 0
+        return A
+
+    # For a sweep, the rows are found for each parameter set.
+    infinite = isinf(A)
+    rows = infinite.any(axis=1)[:, None]
+    return where(rows, where(infinite, sign(A), 0), A)
+
+
+def _lu_factor_batch(A):
+    """Return a list of the LU factorisations of the matrices
+    A[:, :, m] for each parameter set m of a sweep.  A RuntimeError is
+    raised if a matrix is singular."""
+
+    factors = []
+    for m in range(A.shape[2]):
+        lu, piv = lu_factor(A[:, :, m], check_finite=False)
+        if (diag(lu) == 0).any():
+            raise RuntimeError('Singular matrix')
+        factors.append((lu, piv))
+    return factors
+
+
+def _lu_solve_batch(factors, Z):
+    """Solve using the factorisations from _lu_factor_batch, where Z
+    has a column for each parameter set."""
+
+    return array([lu_solve(factor, Z[:, m], check_finite=False)
+                  for m, factor in enumerate(factors)]).T
+
+
+def _bdf2_coeffs(dt, dt1):
+    """Return the coefficients a, b1, and b2 of the variable step BDF2
+    formula a x[n] - b1 x[n - 1] + b2 x[n - 2] = dt x'[n], where dt1 is
+    the previous time step.  If dt1 is None, the coefficients are for
+    backward-Euler."""
+
+    if dt1 is None:
+        return 1, 1, 0
+
+    w = dt / dt1
+    return (1 + 2 * w) / (1 + w), 1 + w, w ** 2 / (1 + w)
 
 
 class SimulatedComponent(object):
 
-    def __init__(self, cpt, v1_index, v2_index, v3_index, i_index):
+    # Number of previous values required by the integration method.
+    steps = 1
+
+    def __init__(self, cpt, v1_index, v2_index, v3_index, i_index,
+                 params=None):
         
+        self.params = params
         self.nodes = cpt.nodenames
         self.name = cpt.name
         self.Reqname = 'R%seq' % cpt.name
@@ -36,18 +175,37 @@ class SimulatedComponent(object):
         self.v3_index = v3_index        
         self.i_index = i_index
 
-    def subsdict(self, n, dt, v1, v2, i):
+    def _value(self, value):
+        """Convert component value to a float.  For a sweep, an array of
+        values is returned for the arrays of parameter values."""
+
+        if self.params is not None:
+            undefined = value.free_symbols - set(self.params)
+            if undefined != set():
+                raise ValueError('Undefined symbols %s for %s' % (undefined, self.name))
+            values = list(self.params.values())
+            func = lambdify(list(self.params), value, 'numpy')
+            return func(*values) + zeros(len(values[0]))
+
+        try:
+            return float(value)
+        except TypeError:
+            raise ValueError('Undefined symbols %s for %s; use subs to replace with numerical values' % (value.free_symbols, self.name))
+
+    def subsdict(self, n, dt, v1, v2, i, dt1=None):
         """Create a dictionary of substitutions."""
 
-        geq = self.geq(n, dt, v1, v2, i)        
-        veq = self.veq(n, dt, v1, v2, i)
+        geq = self.geq(dt, dt1)
+        veq = self.veq(n, dt, v1, v2, i, dt1)
 
         return {self.Reqsym:1 / geq, self.Veqsym:veq}    
 
-    def stamp(self, A, Z, num_nodes, n, dt, v1, v2, i):
+    def stamp_A(self, A, dt, dt1=None):
+        """Stamp the companion model conductance into the A matrix.
+        This only depends on the time step dt and, for multistep
+        methods, the previous time step dt1."""
 
-        geq = self.geq(n, dt, v1, v2, i)
-        veq = self.veq(n, dt, v1, v2, i)        
+        geq = self.geq(dt, dt1)
         
         n1, n2 = self.v1_index, self.v3_index
 
@@ -59,39 +217,99 @@ class SimulatedComponent(object):
         if n2 >= 0:
             A[n2, n2] += geq
 
+    def flux_current(self, branch_currents):
+        """Return the current used by the companion model."""
+
+        return branch_currents[self.i_index]
+
+    def state(self, results, indices):
+        """Return the state variable, the capacitor voltage or inductor
+        current, at the specified time indices."""
+
+        if self.is_inductor:
+            return results.branch_currents[self.i_index, indices]
+        return (results.node_voltages[self.v1_index, indices] -
+                results.node_voltages[self.v2_index, indices])
+
+    def stamp_Z(self, Z, num_nodes, n, dt, v1, v2, i, dt1=None):
+        """Stamp the companion model voltage into the Z vector."""
+
         m = self.i_index + num_nodes
-        Z[m] += veq
+        Z[m] += self.veq(n, dt, v1, v2, i, dt1)
         
 
 class SimulatedCapacitor(SimulatedComponent):
 
-    def __init__(self, C, v1_index, v2_index, v3_index, i_index):
+    is_inductor = False
+
+    def __init__(self, C, v1_index, v2_index, v3_index, i_index,
+                 params=None):
 
         super (SimulatedCapacitor, self).__init__(C, v1_index, v2_index,
-                                                  v3_index, i_index)
-        self.Cval = C.C.expr
+                                                  v3_index, i_index, params)
+        self.Cval = self._value(C.C.expr)
+        # Initial voltage.
+        self.ic = self._value(C.cpt.v0.expr)
 
     
 class SimulatedInductor(SimulatedComponent):
 
-    def __init__(self, L, v1_index, v2_index, v3_index, i_index):
+    is_inductor = True
+
+    def __init__(self, L, v1_index, v2_index, v3_index, i_index,
+                 params=None):
 
         super (SimulatedInductor, self).__init__(L, v1_index, v2_index,
-                                                 v3_index, i_index)
-        self.Lval = L.L.expr
+                                                 v3_index, i_index, params)
+        self.Lval = self._value(L.L.expr)
+        # Initial current.
+        self.ic = self._value(L.cpt.i0.expr)
+        # Mutual inductances with other inductors.
+        self.couplings = []
+
+    def couple(self, other, M, num_nodes):
+        """Add mutual inductance `M` with the inductor `other`."""
+
+        self.couplings.append((num_nodes + self.i_index,
+                               num_nodes + other.i_index,
+                               other.i_index, M / self.Lval))
+
+    def stamp_A(self, A, dt, dt1=None):
+        """Stamp the companion model conductance into the A matrix.  The
+        voltage due to the current through each coupled inductor is
+        stamped into the branch equation for the companion voltage
+        source."""
+
+        super (SimulatedInductor, self).stamp_A(A, dt, dt1)
+
+        geq = self.geq(dt, dt1)
+        for m1, m2, index, ratio in self.couplings:
+            A[m1, m2] -= ratio / geq
+
+    def flux_current(self, branch_currents):
+        """Return the current used by the companion model.  For an
+        inductor, this is the flux linkage divided by the inductance
+        so that it includes the currents of coupled inductors."""
+
+        i = branch_currents[self.i_index]
+        for m1, m2, index, ratio in self.couplings:
+            i = i + ratio * branch_currents[index]
+        return i
 
         
 class SimulatedCapacitorTrapezoid(SimulatedCapacitor):
 
-    def geq(self, n, dt, v1, v2, i):
+    # Order of accuracy and error constant of the local truncation
+    # error of the integration method.
+    order = 2
+    lte_constant = 1 / 12
+
+    def geq(self, dt, dt1=None):
 
         return (2 * self.Cval) / dt
 
-    def veq(self, n, dt, v1, v2, i):
+    def veq(self, n, dt, v1, v2, i, dt1=None):
 
-        if n < 1:
-            return 0
-        
         v = v1[n - 1] - v2[n - 1]
 
         geq = (2 * self.Cval) / dt
@@ -101,14 +319,16 @@ class SimulatedCapacitorTrapezoid(SimulatedCapacitor):
 
 class SimulatedInductorTrapezoid(SimulatedInductor):
 
-    def geq(self, n, dt, v1, v2, i):
+    # Order of accuracy and error constant of the local truncation
+    # error of the integration method.
+    order = 2
+    lte_constant = 1 / 12
 
-        return dt / (2 * self.Lval)
+    def geq(self, dt, dt1=None):
 
-    def veq(self, n, dt, v1, v2, i):
+        return dt / (2 * self.Lval)
 
-        if n < 1:
-            return 0
+    def veq(self, n, dt, v1, v2, i, dt1=None):
 
         v = v1[n - 1] - v2[n - 1]
         
@@ -118,31 +338,95 @@ class SimulatedInductorTrapezoid(SimulatedInductor):
 
 class SimulatedCapacitorBackwardEuler(SimulatedCapacitor):
 
-    def geq(self, n, dt, v1, v2, i):
+    # Order of accuracy and error constant of the local truncation
+    # error of the integration method.
+    order = 1
+    lte_constant = 1 / 2
 
-        return self.Cval / dt
+    def geq(self, dt, dt1=None):
 
-    def veq(self, n, dt, v1, v2, i):
+        return self.Cval / dt
 
-        if n < 1:
-            return 0
+    def veq(self, n, dt, v1, v2, i, dt1=None):
 
         return v1[n - 1] - v2[n - 1]
 
 
 class SimulatedInductorBackwardEuler(SimulatedInductor):
 
-    def geq(self, n, dt, v1, v2, i):
+    # Order of accuracy and error constant of the local truncation
+    # error of the integration method.
+    order = 1
+    lte_constant = 1 / 2
+
+    def geq(self, dt, dt1=None):
 
         return dt / self.Lval
 
-    def veq(self, n, dt, v1, v2, i):
+    def veq(self, n, dt, v1, v2, i, dt1=None):
 
         geq = dt / self.Lval
         veq = -i[n - 1] / geq
         return veq                    
 
 
+class SimulatedCapacitorBDF2(SimulatedCapacitor):
+
+    order = 2
+    lte_constant = 2 / 9
+    steps = 2
+
+    def geq(self, dt, dt1=None):
+
+        a, b1, b2 = _bdf2_coeffs(dt, dt1)
+        return a * self.Cval / dt
+
+    def veq(self, n, dt, v1, v2, i, dt1=None):
+
+        a, b1, b2 = _bdf2_coeffs(dt, dt1)
+        veq = b1 * (v1[n - 1] - v2[n - 1])
+        if b2 != 0:
+            veq -= b2 * (v1[n - 2] - v2[n - 2])
+        return veq / a
+
+
+class SimulatedInductorBDF2(SimulatedInductor):
+
+    order = 2
+    lte_constant = 2 / 9
+    steps = 2
+
+    def geq(self, dt, dt1=None):
+
+        a, b1, b2 = _bdf2_coeffs(dt, dt1)
+        return dt / (a * self.Lval)
+
+    def veq(self, n, dt, v1, v2, i, dt1=None):
+
+        a, b1, b2 = _bdf2_coeffs(dt, dt1)
+        veq = b1 * i[n - 1]
+        if b2 != 0:
+            veq -= b2 * i[n - 2]
+        return -veq * self.Lval / dt
+
+
+# The TR-BDF2 method takes a trapezoidal step to an intermediate time
+# followed by a BDF2 step using the values at the start and
+# intermediate times.  The stage_cls attribute is the companion model
+# for the trapezoidal step.
+
+class SimulatedCapacitorTRBDF2(SimulatedCapacitorBDF2):
+
+    lte_constant = (3 * TRBDF2_gamma ** 2 - 4 * TRBDF2_gamma + 2) / (12 * (2 - TRBDF2_gamma))
+    stage_cls = SimulatedCapacitorTrapezoid
+
+
+class SimulatedInductorTRBDF2(SimulatedInductorBDF2):
+
+    lte_constant = SimulatedCapacitorTRBDF2.lte_constant
+    stage_cls = SimulatedInductorTrapezoid
+
+
 class SimulationResultsNode(object):
 
     def __init__(self, v):
@@ -156,13 +440,37 @@ class SimulationResultsCpt(object):
         self.i = i
 
         
+class SimulationHistory(object):
+    """This class holds the node voltages and branch currents at the
+    last few times as a ring buffer.  The companion models index these
+    with the time index modulo the buffer size; negative indices wrap
+    around to the previous times."""
+
+    def __init__(self, num_nodes, num_branches, size, batch=None):
+
+        # For a sweep, there is an extra axis for the parameter sets.
+        shape = (size, ) if batch is None else (size, batch)
+
+        self.num_nodes = num_nodes
+        self.t = zeros(size)
+        # NB, node_voltages is zero for index = -1            
+        self.node_voltages = zeros((num_nodes + 1, ) + shape)
+        self.branch_currents = zeros((num_branches, ) + shape)
+
+        
 class SimulationResults(object):
 
-    def __init__(self, tv, cct, r_model, node_list, branch_list):
+    def __init__(self, tv, cct, r_model, node_list, branch_list,
+                 probes=None, filename=None, batch=None):
 
         self.t = tv
         self.cct = cct
         self.r_model = r_model
+        self.filename = filename
+        # Number of parameter sets for a sweep.
+        self.batch = batch
+        # Parameter values for a sweep.
+        self.subsdict = {}
         
         N = len(tv)
 
@@ -173,10 +481,168 @@ class SimulationResults(object):
 
         self.num_nodes = len(node_list) - 1
         self.num_branches = len(branch_list)
-        
-        self.node_voltages = zeros((self.num_nodes + 1, N))
-        self.branch_currents = zeros((self.num_branches, N))
 
+        # Indices of the node voltages and branch currents that are
+        # stored.
+        self.nodes, self.branches = self._probe_indices(probes)
+        self._node_rows = dict([(index, row) for row, index
+                                in enumerate(self.nodes)])
+        self._node_rows[-1] = -1
+        self._branch_rows = dict([(index, row) for row, index
+                                  in enumerate(self.branches)])
+
+        # The results are stored with a row for each time so that each
+        # time step writes contiguous data to the memory-mapped files.
+        self._voltages, self._currents = self._allocate(N)
+
+    @property
+    def node_voltages(self):
+        """Array of stored node voltages with a row for each node and a
+        column for each time.  The last row is for ground."""
+
+        return self._voltages.T
+
+    @property
+    def branch_currents(self):
+        """Array of stored branch currents with a row for each branch and
+        a column for each time."""
+
+        return self._currents.T
+
+    def _probe_indices(self, probes):
+        """Return the indices of the node voltages and branch currents
+        required for the nodes and components named in `probes`."""
+
+        if probes is None:
+            return list(range(self.num_nodes)), list(range(self.num_branches))
+
+        r_model = self.r_model
+        nodes = set()
+        branches = set()
+        for name in probes:
+            # If name is an integer, convert to a string.
+            if isinstance(name, int):
+                name = '%d' % name
+
+            if name in self.cct.nodes:
+                nodes.add(r_model._node_index(name))
+            elif name in self.cct._elements:
+                cpt = self.cct._elements[name]
+                for node in cpt.nodenames[0:2]:
+                    nodes.add(r_model._node_index(node))
+                for branch in (name, 'V%seq' % name):
+                    if branch in r_model.unknown_branch_currents:
+                        branches.add(r_model._branch_index(branch))
+            else:
+                raise ValueError('Unknown element or node name %s' % name)
+
+        nodes.discard(-1)
+        return sorted(nodes), sorted(branches)
+
+    def _allocate(self, N, suffix=''):
+        """Return arrays for the node voltages and branch currents for N
+        times.  If filename was specified, these are memory-mapped
+        .npy files."""
+
+        shapes = ((N, len(self.nodes) + 1), (N, len(self.branches)))
+        if self.batch is not None:
+            shapes = [shape + (self.batch, ) for shape in shapes]
+        if self.filename is None:
+            return [zeros(shape) for shape in shapes]
+
+        return [open_memmap(self._path(name) + suffix, mode='w+',
+                            dtype=float, shape=shape)
+                for name, shape in zip(('voltages', 'currents'), shapes)]
+
+    def _path(self, name):
+
+        return '%s-%s.npy' % (self.filename, name)
+
+    def _replace(self, arrays):
+        """Replace the arrays for the node voltages and branch currents;
+        the memory-mapped files are renamed over the original files."""
+
+        if self.filename is not None:
+            for new in arrays:
+                new.flush()
+            self._voltages = self._currents = None
+            for name in ('voltages', 'currents'):
+                replace(self._path(name) + '.tmp', self._path(name))
+            arrays = [open_memmap(self._path(name), mode='r+')
+                      for name in ('voltages', 'currents')]
+        self._voltages, self._currents = arrays
+
+    def _store(self, n, history, m):
+        """Store the node voltages and branch currents for time index `n`
+        from column `m` of the history."""
+
+        self._voltages[n, :-1] = history.node_voltages[self.nodes, m]
+        self._currents[n] = history.branch_currents[self.branches, m]
+
+    def _split(self, params):
+        """Return a list of the results for each parameter set of a
+        sweep, where `params` is a dictionary of arrays of parameter
+        values."""
+
+        results = []
+        for m in range(self.batch):
+            new = object.__new__(self.__class__)
+            new.__dict__.update(self.__dict__)
+            new.batch = None
+            new.subsdict = dict([(symbol, values[m]) for symbol, values
+                                 in params.items()])
+            new._voltages = self._voltages[..., m]
+            new._currents = self._currents[..., m]
+            results.append(new)
+        return results
+
+    def _store_block(self, n, x, num_nodes):
+        """Store the node voltages and branch currents for the times
+        starting at index `n` from the MNA solutions `x`, with a
+        column for each time."""
+
+        M = x.shape[1]
+        self._voltages[n:n + M, :-1] = x[self.nodes].T
+        self._currents[n:n + M] = x[[num_nodes + index for index
+                                     in self.branches]].T
+
+    def _resize(self, N):
+        """Change the number of time steps to N, say as the time steps
+        are accepted for adaptive time stepping."""
+
+        M = min(N, len(self.t))
+        t = zeros(N)
+        t[:M] = self.t[:M]
+        self.t = t
+
+        arrays = self._allocate(N, '.tmp')
+        for new, old in zip(arrays, (self._voltages, self._currents)):
+            new[:M] = old[:M]
+        self._replace(arrays)
+
+    def _interpolate(self, tv):
+        """Linearly interpolate the results at the times `tv`."""
+
+        arrays = self._allocate(len(tv), '.tmp')
+        for new, old in zip(arrays, (self._voltages, self._currents)):
+            for m in range(old.shape[1]):
+                new[:, m] = interp(tv, self.t, old[:, m])
+        self.t = tv
+        self._replace(arrays)
+
+    def _node_row(self, index):
+
+        try:
+            return self._node_rows[index]
+        except KeyError:
+            raise ValueError('Node %s not probed' % self.r_model.node_list[index + 1])
+
+    def _branch_row(self, index):
+
+        try:
+            return self._branch_rows[index]
+        except KeyError:
+            raise ValueError('Current for %s not probed' % self.r_model.unknown_branch_currents[index])
 
     def __getitem__(self, name):
         """Return element or node by name."""
@@ -210,7 +676,7 @@ class SimulationResults(object):
 
     def node_voltages_get(self, n):
 
-        index = self.r_model._node_index(n)
+        index = self._node_row(self.r_model._node_index(n))
         # NB, node_voltages is zero for index = -1
         return self.node_voltages[index]
         
@@ -232,22 +698,52 @@ class SimulationResults(object):
 
     def cpt_currents_get(self, cptname):
 
-        try:
-            index = self.r_model._branch_index(cptname)
+        r_model = self.r_model
+        cpt = self.cct._elements[cptname]
+        if cptname in r_model.unknown_branch_currents:
+            index = self._branch_row(r_model._branch_index(cptname))
+            # As for MNA, the current through a source flows out of
+            # its positive node.
+            if cpt.is_source:
+                return -self.branch_currents[index]
             return self.branch_currents[index]
-        except:
-            cpt = self.cct._elements[cptname]
-            if cpt.is_capacitor or cpt.is_inductor:
-                # For a capacitor we can find the current through the
-                # companion resistor or voltage source.
-                return self.cpt_currents_get('V%seq' % cptname)
-
-            Vd = self.cpt_voltages_get(cptname)            
-            if cpt.is_resistor:
-                return Vd / cpt.R.expr
-                
-            # Need to determine resistance of the cpt
-            raise ValueError('FIXME')            
+
+        if cpt.type in ('C', 'L'):
+            # For a capacitor we can find the current through the
+            # companion resistor or voltage source.
+            index = self._branch_row(r_model._branch_index('V%seq' % cptname))
+            return self.branch_currents[index]
+
+        if cpt.type in ('O', 'P'):
+            return zeros(len(self.t))
+
+        if cpt.type == 'R':
+            Vd = self.cpt_voltages_get(cptname)
+            return Vd / float(cpt.R.expr.subs(self.subsdict))
+
+        if cpt.type in ('Z', 'Y'):
+            # These are modelled as resistors.
+            Vd = self.cpt_voltages_get(cptname)
+            return Vd / float(cpt.Z.expr.subs(self.subsdict))
+
+        # The currents of the current sources are injected into their
+        # first node.
+        elt = r_model.elements[cptname]
+        if cpt.type == 'I':
+            Isc = Matrix([elt.Isc.expr.subs(self.subsdict)])
+            return sources_evaluate(Isc, self.t)[0]
+
+        if cpt.type == 'G':
+            G = float(cExpr(elt.args[0]).expr.subs(self.subsdict))
+            return G * (self.node_voltages_get(elt.nodenames[2]) -
+                        self.node_voltages_get(elt.nodenames[3]))
+
+        if cpt.type == 'F':
+            F = float(cExpr(elt.args[1]).expr.subs(self.subsdict))
+            index = self._branch_row(r_model._branch_index(elt.args[0]))
+            return F * self.branch_currents[index]
+
+        raise ValueError('Cannot determine current for %s' % cptname)
 
     def cpt_current_get(self, cptname, n):
 
@@ -290,128 +786,778 @@ class Simulator(object):
         self.cct = cct
 
         # Companion resistor model
-        self.r_model = cct.r_model().subcircuits['time']
+        subcircuits = cct.r_model().subcircuits
+        if 'time' not in subcircuits:
+            r_model = cct.r_model()
+            names = [elt.name for elt in r_model.elements.values()
+                     if elt.reactive]
+            if names != []:
+                raise ValueError('Cannot simulate frequency dependent '
+                                 'components %s' % ', '.join(names))
+            raise ValueError('Cannot simulate circuit without a time-domain '
+                             'model; it has %s models' % ', '.join(subcircuits))
+        self.r_model = subcircuits['time']
       
-    def _step(self, foo, n, tv, results):
+    def _factor(self, dt, dt1=None, cpts=None):
+        """Return the LU factorisation of the A matrix with the companion
+        model conductances of `cpts` for time step `dt` (and previous
+        time step `dt1` for multistep methods).  Since the A matrix
+        only depends on the conductances, the factorisations are
+        cached for each set of conductances.  Conductances that differ
+        by rounding errors, say from linspace, are treated as the
+        same."""
+
+        if cpts is None:
+            cpts = self.reactive_cpts
+
+        # Look up the conductances for the time steps since finding
+        # them for many components is slow.
+        step_key = (float('%.12g' % dt), dt1 and float('%.12g' % dt1),
+                    cpts is self.stage_cpts)
+        if self.batch is not None:
+            return self._factor_batch(step_key, dt, dt1, cpts)
+
+        key = self._lu_keys.get(step_key)
+        if key is None:
+            key = tuple([float('%.12g' % cpt.geq(dt, dt1)) for cpt in cpts])
+            self._lu_keys[step_key] = key
+        if key in self._lu:
+            return self._lu[key]
 
-        # Substitute values into the MNA A matrix and Z vector,
-        # then perform numerical inversion of the A matrix.
-        # Alternatively, a faster way, if the A matrix was small,
-        # would be to symbolically invert the A matrix and
-        # then substitute values.
+        # Ensure have a copy.
+        A = self.A.copy()
 
-        if n == 0:
-            if not self.cct.is_ivp:
-                # Initial voltages and currents all zero.
-                return
-            p_model = self.cct.pre_initial_model()
-            # Evaluate model and copy node voltages and branch currents...
-            
-            return
+        for cpt in cpts:
+            cpt.stamp_A(A, dt, dt1)
 
-        dt = tv[n] - tv[n - 1]
-        subsdict = {tsym: tv[n]}            
-        
-        Zsym = self.Zsym
-        Zsym = Zsym.subs(subsdict)        
-        Z = array(Zsym).astype(float).squeeze()
+        if self.sparse:
+            try:
+                self._lu[key] = splu(A.tocsc())
+            except RuntimeError:
+                raise ValueError('The A matrix is singular for time step %s' % dt)
+            return self._lu[key]
 
-        if n == 1 and Zsym.free_symbols != set():
-            raise ValueError('Undefined symbols %s in Z vector; use subs to replace with numerical values' % Zsym.free_symbols)
+        lu, piv = lu_factor(A, check_finite=False)
+        if (diag(lu) == 0).any():
+            raise ValueError('The A matrix is singular for time step %s' % dt)
+        self._lu[key] = lu, piv
+        return self._lu[key]
+
+    def _factor_batch(self, key, dt, dt1, cpts):
+        """Return a list of the LU factorisations of the A matrices for
+        the parameter sets of a sweep."""
+
+        if key in self._lu:
+            return self._lu[key]
 
         # Ensure have a copy.
-        A = self.A + 0
-        
+        A = self.A.copy()
+
+        for cpt in cpts:
+            cpt.stamp_A(A, dt, dt1)
+
+        try:
+            self._lu[key] = _lu_factor_batch(A)
+        except RuntimeError:
+            raise ValueError('The A matrix is singular for time step %s' % dt)
+        return self._lu[key]
+
+    def _analyse_sparse(self, r_model):
+        """Stamp the MNA A matrix of the companion circuit into a sparse
+        matrix and return it with the Z vector.  The companion
+        resistors and voltages are not stamped since these are stamped
+        for each time step."""
+
+        num_nodes = len(r_model.node_list) - 1
+        num_branches = len(r_model.unknown_branch_currents)
+
+        stamps = MNAStamps(r_model,
+                           SparseStampMatrix(num_nodes, num_nodes),
+                           SparseStampMatrix(num_nodes, num_branches),
+                           SparseStampMatrix(num_branches, num_nodes),
+                           SparseStampMatrix(num_branches, num_branches),
+                           SparseStampMatrix(num_nodes, 1, numeric=False),
+                           SparseStampMatrix(num_branches, 1, numeric=False))
+
+        Reqnames = [cpt.Reqname for cpt in self.reactive_cpts]
+        for elt in r_model.elements.values():
+            if elt.name not in Reqnames:
+                elt._stamp(stamps)
+
         for cpt in self.reactive_cpts:
+            stamps._Es[cpt.i_index] = 0
+
+        A = stamp_block_matrix(stamps._G, stamps._B, stamps._C, stamps._D)
+        A.numeric = True
+        Z = stamp_block_vector(stamps._Is, stamps._Es)
+
+        Zsym = zeros_matrix(Z.shape[0], 1)
+        for (row, col), value in Z.entries.items():
+            Zsym[row] = value
+        return A, Zsym
+
+    def _solve(self, n, dt, Z, results, dt1=None, cpts=None):
+        """Add the companion model voltages to the MNA Z vector and
+        solve for time index `n` using the LU factorisation of the A
+        matrix for the time step `dt`."""
+
+        if cpts is None:
+            cpts = self.reactive_cpts
+
+        for cpt in cpts:
 
             # NB, node_voltages is zero for index = -1            
             v1 = results.node_voltages[cpt.v1_index]
             v2 = results.node_voltages[cpt.v2_index]            
-            i = results.branch_currents[cpt.i_index]
+            i = cpt.flux_current(results.branch_currents)
 
-            cpt.stamp(A, Z, results.num_nodes, n, dt, v1, v2, i)
+            cpt.stamp_Z(Z, results.num_nodes, n, dt, v1, v2, i, dt1)
 
-        Ainv = linalg.inv(A)
-        
-        results1 = dot(Ainv, Z)
+        if self.batch is not None:
+            results1 = _lu_solve_batch(self._factor(dt, dt1, cpts), Z)
+        elif self.sparse:
+            results1 = self._factor(dt, dt1, cpts).solve(Z)
+        else:
+            results1 = lu_solve(self._factor(dt, dt1, cpts), Z)
 
         num_nodes = results.num_nodes
         results.node_voltages[0:num_nodes, n] = results1[0:num_nodes]
         results.branch_currents[:, n] = results1[num_nodes:]        
 
-    def __call__(self, tv, integrator='trapezoid'):
+    def _source_model(self, dc=False):
+        """Return the A matrix where the companion model of each capacitor
+        is replaced by a voltage source and the companion model of
+        each inductor is replaced by a current source.  The source
+        values are the Z vector entries for the companion voltage
+        source branches.  If `dc` is True, the capacitors are replaced
+        by current sources and the inductors by voltage sources
+        instead."""
+
+        num_nodes = len(self.r_model.node_list) - 1
+
+        A = self.A.copy()
+        if self.sparse:
+            A = A.tocsc().tolil()
+
+        for cpt in self.reactive_cpts:
+            n1, n3 = cpt.v1_index, cpt.v3_index
+            m = num_nodes + cpt.i_index
+
+            if cpt.is_inductor == dc:
+                # Replace the companion resistor by a short circuit so
+                # that the companion voltage source is the voltage.
+                # Note, there are no sources at the dummy node.
+                if n1 >= 0:
+                    A[n1, :] = A[n1, :] + A[n3, :]
+                A[n3, :] = 0
+                A[n3, n3] = 1
+                if n1 >= 0:
+                    A[n3, n1] = -1
+            else:
+                # Replace the companion model by a current source,
+                # keeping a resistor to define the voltage of the
+                # dummy node.
+                if n1 >= 0:
+                    A[n1, n1] += 1
+                    A[n1, n3] -= 1
+                    A[n3, n1] -= 1
+                A[n3, n3] += 1
+                A[m, :] = 0
+                A[m, m] = 1
+        return A
+
+    def _source_factor(self, A):
+        """Return the factorisation of the A matrix from _source_model."""
+
+        try:
+            if self.batch is not None:
+                return _lu_factor_batch(A)
+            elif self.sparse:
+                return splu(A.tocsc())
+            lu, piv = lu_factor(A, check_finite=False)
+            if (diag(lu) == 0).any():
+                raise RuntimeError
+            return lu, piv
+        except RuntimeError:
+            raise ValueError('The A matrix with the capacitors and inductors replaced by sources is singular')
+
+    def _source_solve(self, lu, Z):
+        """Solve using the factorisation from _source_factor.  Z can have
+        a column for each time."""
+
+        if self.batch is not None:
+            return _lu_solve_batch(lu, Z)
+        elif self.sparse:
+            return lu.solve(Z)
+        return lu_solve(lu, Z)
+
+    def _initial(self, t0, history):
+        """Solve for the node voltages and branch currents at time `t0`
+        and store them in the first column of the history.  The
+        capacitor voltages and inductor currents are their initial
+        values (zero if not specified).  For the 'dc' operating point,
+        the capacitor currents and inductor voltages are zero
+        instead."""
+
+        num_nodes = history.num_nodes
+        dc = self.initial == 'dc'
+
+        Z = self.Zfunc([t0])[:, 0]
+        for cpt in self.reactive_cpts:
+            Z[num_nodes + cpt.i_index] = 0 if dc else cpt.ic
+
+        lu = self._source_factor(self._source_model(dc))
+        x = self._source_solve(lu, Z)
+
+        history.node_voltages[0:num_nodes, 0] = x[0:num_nodes]
+        history.branch_currents[:, 0] = x[num_nodes:]
+
+    def _discretise(self, Ass, dt):
+        """Return the matrices Phi, Gamma1, and Gamma2 of the exact
+        discretisation of dx/dt = Ass x + f(t) for time step `dt`,
+        assuming f(t) is linear between the time steps.  Then
+        x[n] = Phi x[n - 1] + Gamma1 f[n - 1] + Gamma2 f[n]."""
+
+        key = float('%.12g' % dt)
+        if key in self._lu:
+            return self._lu[key]
+
+        N = Ass.shape[0]
+        M = zeros((3 * N, 3 * N))
+        M[0:N, 0:N] = Ass * dt
+        M[0:N, N:2 * N] = eye(N) * dt
+        M[N:2 * N, 2 * N:] = eye(N)
+        E = expm(M)
+
+        Phi = E[0:N, 0:N]
+        Gamma2 = E[0:N, 2 * N:]
+        Gamma1 = E[0:N, N:2 * N] - Gamma2
+        self._lu[key] = Phi, Gamma1, Gamma2
+        return self._lu[key]
+
+    def _exact(self, tv, results):
+        """Find the results using the exact discretisation of the state
+        equations, where the state variables x are the capacitor
+        voltages and inductor currents.  The MNA unknowns are found
+        from x and the sources by replacing the capacitors and
+        inductors by sources, w = M^-1 (Z + E x).  Then D dx/dt = K w,
+        where K selects the capacitor currents and inductor voltages
+        and D is the matrix of capacitances and inductances (including
+        the mutual inductances)."""
+
+        # Number of times to find at once.
+        chunk = 1024
+
+        history = self._history
+        num_nodes = history.num_nodes
+        cpts = self.reactive_cpts
+        N = self.A.shape[0]
+
+        lu = self._source_factor(self._source_model())
+
+        E = zeros((N, len(cpts)))
+        K = zeros((len(cpts), N))
+        D = zeros((len(cpts), len(cpts)))
+        x0 = zeros(len(cpts))
+        if self.initial == 'dc':
+            self._initial(tv[0], history)
+        states = dict([(cpt.i_index, k) for k, cpt in enumerate(cpts)])
+        for k, cpt in enumerate(cpts):
+            E[num_nodes + cpt.i_index, k] = 1
+            if cpt.is_inductor:
+                for index, polarity in ((cpt.v1_index, 1), (cpt.v2_index, -1)):
+                    if index >= 0:
+                        K[k, index] = polarity
+                D[k, k] = cpt.Lval
+                for m1, m2, index, ratio in cpt.couplings:
+                    D[k, states[index]] = ratio * cpt.Lval
+            else:
+                K[k, num_nodes + cpt.i_index] = 1
+                D[k, k] = cpt.Cval
+
+            if self.initial == 'dc':
+                x0[k] = cpt.state(history, [0])[0]
+            else:
+                x0[k] = cpt.ic
+
+        ME = self._source_solve(lu, E).reshape(N, len(cpts))
+        K = solve(D, K)
+        Ass = K.dot(ME)
+
+        x = x0
+        f = None
+        for start in range(0, len(tv), chunk):
+            stop = min(start + chunk, len(tv))
+            W = self._source_solve(lu, self.Z[:, start:stop]).reshape(N, -1)
+            F = K.dot(W)
+
+            X = zeros((len(cpts), stop - start))
+            for n in range(start, stop):
+                if n > 0:
+                    Phi, Gamma1, Gamma2 = self._discretise(Ass, tv[n] - tv[n - 1])
+                    x = Phi.dot(x) + Gamma1.dot(f) + Gamma2.dot(F[:, n - start])
+                f = F[:, n - start]
+                X[:, n - start] = x
+
+            W += ME.dot(X)
+            results._store_block(start, W, num_nodes)
+
+    def _step(self, foo, n, tv, results):
+
+        history = self._history
+        m = n % history.t.shape[0]
+        history.t[m] = tv[n]
+
+        if n == 0:
+            self._initial(tv[0], history)
+            results._store(n, history, m)
+            return
+
+        dt = tv[n] - tv[n - 1]
+        dt1 = None
+        if n >= 2:
+            dt1 = tv[n - 1] - tv[n - 2]
+
+        # Ensure have a copy.
+        Z = self.Z[:, n].copy()
+        Zstage = None
+        if self.stage_cpts is not None:
+            Zstage = self.Zstage[:, n - 1].copy()
+        self._advance(m, dt, dt1, Z, Zstage, history)
+        results._store(n, history, m)
+
+    def _advance(self, m, dt, dt1, Z, Zstage, history):
+        """Solve for column `m` of the history given the time step `dt`,
+        the previous time step `dt1` (None for the first step), and the
+        Z vectors at the end of the time step and, for TR-BDF2, at the
+        intermediate time."""
+
+        if self.stage_cpts is None:
+            self._solve(m, dt, Z, history, dt1)
+            return
+
+        # The stage history has the values at the start, intermediate,
+        # and end times of the time step.
+        stage = self._stage
+        stage.node_voltages[:, 0] = history.node_voltages[:, m - 1]
+        stage.branch_currents[:, 0] = history.branch_currents[:, m - 1]
+
+        dt1 = TRBDF2_gamma * dt
+        self._solve(1, dt1, Zstage, stage, cpts=self.stage_cpts)
+        self._solve(2, dt - dt1, Z, stage, dt1)
+
+        history.node_voltages[:, m] = stage.node_voltages[:, 2]
+        history.branch_currents[:, m] = stage.branch_currents[:, 2]
+
+    def _error_ratio(self, m, history, reltol, abstol):
+        """Return the largest ratio of the local truncation error (LTE)
+        estimate for the state variables at column `m` of the history
+        to the tolerance.  The LTE is estimated from the divided
+        difference of order p + 1 of the last p + 2 values, where p is
+        the order of the integration method."""
+
+        ratio = 0
+        for cpt in self.reactive_cpts:
+            p = cpt.order
+            indices = range(m - p - 1, m + 1)
+            t = history.t[indices]
+            x = cpt.state(history, indices)
+
+            dd = x.copy()
+            for k in range(1, p + 2):
+                dd[k:] = (dd[k:] - dd[k - 1:-1]) / (t[k:] - t[:-k])
+
+            dt = t[-1] - t[-2]
+            lte = cpt.lte_constant * factorial(p + 1) * dt ** (p + 1) * abs(dd[-1])
+            tol = reltol * max(abs(x[-1]), abs(x[-2])) + abstol
+            ratio = max(ratio, lte / tol)
+        return ratio
+
+    def _adaptive(self, tv, results, dtmax, reltol, abstol):
+        """Time step from tv[0] to tv[-1] choosing the time steps from the
+        LTE estimate.  The time steps are dtmax / 2**k so that the LU
+        factorisations of the A matrix are reused."""
+
+        # Number of times the step can be halved before giving up.
+        kmax = 30
+
+        history = self._history
+        size = history.t.shape[0]
+
+        t0, tend = tv[0], tv[-1]
+        order = max([cpt.order for cpt in self.reactive_cpts] + [0])
+
+        k = 10
+        n = 0
+        t = t0
+        dt1 = None
+        history.t[0] = t0
+        self._initial(t0, history)
+        # The accepted times replace tv.
+        results.t = zeros(len(results.t))
+        results.t[0] = t0
+        results._store(0, history, 0)
+        while t < tend:
+            dt = dtmax * 2.0 ** -k
+            if t + dt >= tend or isclose(t + dt, tend):
+                dt = tend - t
+            n += 1
+            m = n % size
+            history.t[m] = t + dt
+            Z = self.Zfunc([t + TRBDF2_gamma * dt, t + dt])
+            self._advance(m, dt, dt1, Z[:, 1], Z[:, 0], history)
+
+            ratio = 0
+            if n > order:
+                ratio = self._error_ratio(m, history, reltol, abstol)
+            if ratio > 1:
+                # Reject step.
+                n -= 1
+                k += 1
+                if k > kmax:
+                    raise ValueError('Time step too small at t=%s' % t)
+                continue
+
+            if n >= len(results.t):
+                results._resize(2 * n)
+            results.t[n] = t + dt
+            results._store(n, history, m)
+
+            t += dt
+            dt1 = dt
+            # Double the time step if the error would still be
+            # acceptable.
+            if ratio * 2 ** (order + 1) < 0.5 and k > 0:
+                k -= 1
+
+        results._resize(n + 1)
+
+    def __call__(self, tv, integrator='trapezoid', adaptive=False,
+                 interpolate=False, dtmax=None, reltol=1e-3, abstol=1e-6,
+                 engine=None, probes=None, filename=None, initial='ic'):
         """Numerically evaluate circuit using time-stepping numerical
         integration at the vector of times specified by `tv`.
 
-        Currently the only supported integration methods are
-        trapezoidal and backward-euler (others would be trivial to
-        add).  The trapezoidal integration method is the default since
-        it is accurate but it can be unstable producing some
-        oscillations.  Unfortunately, there is no ideal numerical
-        integration method and there is always a tradeoff between
-        accuracy and stability.
+        The supported integration methods are 'trapezoid',
+        'backward-euler', 'bdf2' (Gear's second order method), and
+        'tr-bdf2'.  The trapezoidal integration method is the default
+        since it is accurate but it can be unstable producing some
+        oscillations.  Backward-Euler is stable but only first order.
+        BDF2 and TR-BDF2 are both second order and L-stable, so they
+        damp these oscillations; TR-BDF2 has a smaller truncation
+        error but requires two solves per time step.
+
+        With the 'exact' integrator, the state equations for the
+        capacitor voltages and inductor currents are discretised
+        exactly using the matrix exponential, assuming the sources
+        vary linearly between the times.  This has no integration
+        error and so large time steps can be used for smooth
+        transients.
+
+        If `adaptive` is True, the time steps between tv[0] and tv[-1]
+        are chosen so that the estimated local truncation error of
+        each capacitor voltage and inductor current is less than
+        reltol times its magnitude plus abstol.  The time steps are
+        no larger than `dtmax` (default a tenth of the simulation
+        time).  The results are for the accepted times unless
+        `interpolate` is True, where they are linearly interpolated
+        at the times `tv`.
+
+        With the 'sparse' `engine`, the A matrix of the companion
+        circuit is stamped into a sparse matrix and factored using a
+        sparse LU factorisation.  This is much faster for large
+        netlists.  By default, the engine is `config.mna_engine`.
+
+        For long simulations of large netlists, `probes` is a list of
+        the names of the nodes and components for which the results
+        are kept; the other results are discarded.  If `filename` is
+        specified, the results are stored in the memory-mapped files
+        filename-voltages.npy and filename-currents.npy rather than in
+        memory.
+
+        The first values are found from the initial capacitor voltages
+        and inductor currents (zero if not specified) with the sources
+        evaluated at tv[0].  If `initial` is 'dc', the first values
+        are the DC operating point instead, where the capacitors are
+        open circuit and the inductors are short circuit.  This avoids
+        simulating a long interval to reach the steady state.
 
         """
 
+        if initial not in ('ic', 'dc'):
+            raise ValueError('Unknown initial values %s' % initial)
+        self.initial = initial
+
+        if engine is None:
+            from .config import mna_engine as engine
+
+        r_model = self.r_model
+
+        # Construct MNA matrices.
+        if engine == 'sparse':
+            r_model._analyse_prepare()
+        elif engine == 'symbolic':
+            r_model._analyse()
+        else:
+            raise ValueError('Unknown MNA engine %s' % engine)
+        self.sparse = engine == 'sparse'
+        self.batch = None
+        self.exact = integrator == 'exact'
+
+        Asubsdict, Zsubsdict = self._make_cpts(integrator)
+
+        if self.sparse:
+            self.A, Zsym = self._analyse_sparse(r_model)
+            self.A = _ideal_limit(self.A)
+        else:
+            # Remove 1 / Req entries
+            Asym = r_model._A.subs(Asubsdict)
+            # Remove Veq entries        
+            Zsym = r_model._Z.subs(Zsubsdict)
+
+            self.Asym = Asym
+
+            if Asym.free_symbols != set():
+                raise ValueError('Undefined symbols %s in A matrix; use subs to replace with numerical values' % Asym.free_symbols)
+
+            # Convert to numpy ndarray
+            self.A = _ideal_limit(array(Asym).astype(float))
+
+        self.Zsym = Zsym
+
+        # Evaluate the independent sources for all the times.
+        self.Zfunc = sources_lambdify(Zsym)
+
+        results = SimulationResults(tv, self.cct, r_model, r_model.node_list,
+                                    r_model.unknown_branch_currents,
+                                    probes, filename)
+        self._run(tv, results, adaptive, interpolate, dtmax, reltol, abstol)
+        return results
+
+    def _make_cpts(self, integrator, params=None):
+        """Create the companion models of the reactive components for the
+        integration method and return the dictionaries of substitutions
+        that remove their resistors and voltages from the MNA A matrix
+        and Z vector."""
+
         if integrator == 'trapezoid':
             Ccls = SimulatedCapacitorTrapezoid
             Lcls = SimulatedInductorTrapezoid
         elif integrator == 'backward-euler':
             Ccls = SimulatedCapacitorBackwardEuler
             Lcls = SimulatedInductorBackwardEuler            
+        elif integrator == 'bdf2':
+            Ccls = SimulatedCapacitorBDF2
+            Lcls = SimulatedInductorBDF2
+        elif integrator == 'tr-bdf2':
+            Ccls = SimulatedCapacitorTRBDF2
+            Lcls = SimulatedInductorTRBDF2
+        elif integrator == 'exact':
+            # The companion models are not used.
+            Ccls = SimulatedCapacitor
+            Lcls = SimulatedInductor
         else:
             raise ValueError('Unknown integrator ' + integrator)
 
         r_model = self.r_model
 
-        # Construct MNA matrices.
-        r_model._analyse()
-
         Asubsdict = {}
         Zsubsdict = {}        
         self.reactive_cpts = []        
+        self.stage_cpts = None
+        if hasattr(Ccls, 'stage_cls'):
+            self.stage_cpts = []
         for key, elt in self.cct.elements.items():
-            if not (elt.is_inductor or elt.is_capacitor):
+            if elt.type not in ('L', 'C'):
                 continue
 
-            if not elt.has_ic:
-                print('Warning, initial conditions for %s ignored' % elt.name)
-            
             v1_index = r_model._node_index(elt.nodenames[0])
             v2_index = r_model._node_index(elt.nodenames[1])
             i_index = r_model._branch_index('V%seq' % elt.name)
             relt = self.r_model.elements['R%seq' % elt.name]
             v3_index = r_model._node_index(relt.nodenames[1])            
             
-            if elt.is_inductor:
+            if elt.type == 'L':
                 cls = Lcls
             else:
                 cls = Ccls
 
-            simcpt = cls(elt, v1_index, v2_index, v3_index, i_index)
+            simcpt = cls(elt, v1_index, v2_index, v3_index, i_index, params)
             self.reactive_cpts.append(simcpt)
+            if self.stage_cpts is not None:
+                self.stage_cpts.append(cls.stage_cls(elt, v1_index, v2_index,
+                                                     v3_index, i_index,
+                                                     params))
 
             Asubsdict[simcpt.Reqsym] = oo
             Zsubsdict[simcpt.Veqsym] = 0
 
-        # Remove 1 / Req entries
+        # Add the mutual inductances of the coupled inductors.
+        num_nodes = len(r_model.node_list) - 1
+        for cpts in (self.reactive_cpts, self.stage_cpts):
+            if cpts is None:
+                continue
+            inductors = dict([(cpt.name, cpt) for cpt in cpts
+                              if cpt.is_inductor])
+            for elt in self.cct.elements.values():
+                if elt.type != 'K':
+                    continue
+                L1 = inductors[elt.Lname1]
+                L2 = inductors[elt.Lname2]
+                M = L1._value(elt.cpt.K.expr) * (L1.Lval * L2.Lval) ** 0.5
+                L1.couple(L2, M, num_nodes)
+                L2.couple(L1, M, num_nodes)
+
+        return Asubsdict, Zsubsdict
+
+    def _run(self, tv, results, adaptive=False, interpolate=False,
+             dtmax=None, reltol=1e-3, abstol=1e-6):
+        """Time step the companion circuit and store the results."""
+
+        r_model = self.r_model
+
+        tv = asarray(tv, dtype=float)
+        if not adaptive:
+            self.Z = self.Zfunc(tv)
+            if self.stage_cpts is not None:
+                self.Zstage = self.Zfunc(tv[:-1] + TRBDF2_gamma * diff(tv))
+
+        self._lu = {}
+        self._lu_keys = {}
+
+        # The history needs the values for the previous time steps
+        # for the LTE estimate.
+        num_nodes = len(r_model.node_list) - 1
+        num_branches = len(r_model.unknown_branch_currents)
+        self._history = SimulationHistory(num_nodes, num_branches, 4,
+                                          self.batch)
+        if self.stage_cpts is not None:
+            self._stage = SimulationHistory(num_nodes, num_branches, 3,
+                                            self.batch)
+        
+        if self.exact:
+            if adaptive:
+                raise ValueError('Adaptive time steps are not needed for the exact integrator')
+            self._exact(tv, results)
+            return
+
+        if not adaptive:
+            for n, t1 in enumerate(tv):
+                self._step(r_model, n, tv, results)
+            return
+
+        if dtmax is None:
+            dtmax = (tv[-1] - tv[0]) / 10
+        self._adaptive(tv, results, dtmax, reltol, abstol)
+        if interpolate:
+            results._interpolate(tv)
+
+    def sweep(self, param_sets, tv, integrator='trapezoid', probes=None,
+              initial='ic'):
+        """Numerically evaluate the circuit at the vector of times `tv`
+        for each of the dictionaries of parameter values in
+        `param_sets`, for example, a Monte Carlo tolerance analysis,
+
+        sim.sweep([{'R1': 1.1, 'C1': 0.9}, {'R1': 0.95, 'C1': 1.05}], tv)
+
+        The dictionary keys are the names of the symbols, say for the
+        symbolic component values.  The companion circuit is
+        constructed once and the A matrix and Z vector are evaluated
+        for all the parameter sets.  The A matrix is LU factored for
+        each parameter set and the time steps are solved for all the
+        parameter sets together.  Parameters can also specify initial
+        conditions, say C1 1 0 1 v0, except with initial='dc'.  A list
+        of SimulationResults is returned.
+
+        """
+
+        if len(param_sets) == 0:
+            return []
+
+        if initial not in ('ic', 'dc'):
+            raise ValueError('Unknown initial values %s' % initial)
+        self.initial = initial
+
+        if integrator == 'exact':
+            raise ValueError('The exact integrator is not supported for sweeps')
+
+        r_model = self.r_model
+        r_model._analyse()
+        self.sparse = False
+        self.exact = False
+
+        # Find the SymPy symbols for the parameter names.
+        symbols = r_model._A.free_symbols | r_model._Z.free_symbols
+        ic_symbols = set()
+        for elt in self.cct.elements.values():
+            if elt.type == 'C':
+                symbols |= elt.C.expr.free_symbols
+                ic_symbols |= elt.cpt.v0.expr.free_symbols
+            elif elt.type == 'L':
+                symbols |= elt.L.expr.free_symbols
+                ic_symbols |= elt.cpt.i0.expr.free_symbols
+            elif elt.type == 'K':
+                symbols |= elt.cpt.K.expr.free_symbols
+        if initial == 'dc':
+            # The initial conditions are not used.
+            ic_symbols -= symbols
+        else:
+            symbols |= ic_symbols
+            ic_symbols = set()
+        ic_names = [str(symbol) for symbol in ic_symbols]
+        symbols = dict([(str(symbol), symbol) for symbol in symbols])
+
+        names = []
+        for param_set in param_sets:
+            for name in param_set:
+                if str(name) not in names:
+                    names.append(str(name))
+        if names == []:
+            raise ValueError('No parameters specified')
+
+        params = {}
+        for name in names:
+            if name in ic_names:
+                raise ValueError('Parameter %s only specifies initial '
+                                 'conditions; these are not used for the dc '
+                                 'operating point' % name)
+            if name not in symbols:
+                raise ValueError('Unknown parameter %s' % name)
+            values = []
+            for param_set in param_sets:
+                param_set = dict([(str(key), value) for key, value
+                                  in param_set.items()])
+                if name not in param_set:
+                    raise ValueError('Missing value for parameter %s' % name)
+                values.append(float(param_set[name]))
+            params[symbols[name]] = array(values)
+        self.batch = len(param_sets)
+
+        Asubsdict, Zsubsdict = self._make_cpts(integrator, params)
+
         Asym = r_model._A.subs(Asubsdict)
-        # Remove Veq entries        
         Zsym = r_model._Z.subs(Zsubsdict)
 
-        self.Asym = Asym
+        undefined = Asym.free_symbols - set(params)
+        if undefined != set():
+            raise ValueError('Undefined symbols %s in A matrix' % undefined)
+
+        # The A matrix has a third axis for the parameter sets.
+        self.A = zeros(Asym.shape + (self.batch, ))
+        for row in range(Asym.shape[0]):
+            for col in range(Asym.shape[1]):
+                value = Asym[row, col]
+                if value == 0:
+                    continue
+                func = lambdify(list(params), value, 'numpy')
+                self.A[row, col] = func(*params.values())
+        self.A = _ideal_limit(self.A)
+
         self.Zsym = Zsym
+        self.Zfunc = sources_lambdify(Zsym, params)
 
-        if Asym.free_symbols != set():
-            raise ValueError('Undefined symbols %s in A matrix; use subs to replace with numerical values' % Asym.free_symbols)
-        
-        # Convert to numpy ndarray
-        self.A = array(Asym).astype(float)        
-        
         results = SimulationResults(tv, self.cct, r_model, r_model.node_list,
-                                    r_model.unknown_branch_currents)
-        
-        for n, t1 in enumerate(tv):
-            self._step(r_model, n, tv, results)
-
-        return results
+                                    r_model.unknown_branch_currents,
+                                    probes, batch=self.batch)
+        self._run(tv, results)
+        return results._split(params)
@@ -0,0 +1,390 @@
+"""
+This module provides sparse numerical matrices for modified nodal
+analysis (MNA) of fully numerical netlists.
+
+Copyright 2020 Michael Hayes, UCECE
+"""
+
+from numpy import zeros, concatenate, asarray, linalg, block, isfinite
+from numpy import finfo, sort_complex, arange, exp
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+import sympy as sym
+
+
+def numeric_value(value):
+    """Convert value to a Python float or complex number.  A ValueError
+    is raised if value is symbolic."""
+
+    try:
+        value = complex(value)
+    except TypeError:
+        raise ValueError('Non-numeric value %s' % value)
+    if value.imag == 0:
+        return value.real
+    return value
+
+
+class SparseStampMatrix(object):
+    """This class collects the MNA stamps of circuit elements for a
+    numerical matrix.  It supports the indexing used by the component
+    _stamp methods, i.e., M[row, col] for matrices and M[row] for
+    vectors.  Only the non-zero entries are stored.
+
+    If numeric is False, the entries are kept as SymPy expressions.
+    This is used to find the stamps of individual elements."""
+
+    def __init__(self, rows, cols, numeric=True):
+
+        self.shape = (rows, cols)
+        self.numeric = numeric
+        self.entries = {}
+
+    def _key(self, key):
+
+        if isinstance(key, tuple):
+            return key
+        return (key, 0)
+
+    def __getitem__(self, key):
+
+        return self.entries.get(self._key(key), 0)
+
+    def __setitem__(self, key, value):
+
+        key = self._key(key)
+        if self.numeric:
+            value = numeric_value(value)
+        if value == 0:
+            self.entries.pop(key, None)
+        else:
+            self.entries[key] = value
+
+    def copy(self):
+
+        new = self.__class__(self.shape[0], self.shape[1], self.numeric)
+        new.entries = self.entries.copy()
+        return new
+
+    @property
+    def is_complex(self):
+
+        for value in self.entries.values():
+            if isinstance(value, complex):
+                return True
+        return False
+
+    def triplets(self, row_offset=0, col_offset=0):
+        """Return lists of rows, columns, and values of the non-zero
+        entries."""
+
+        rows = []
+        cols = []
+        values = []
+        for (row, col), value in self.entries.items():
+            rows.append(row + row_offset)
+            cols.append(col + col_offset)
+            values.append(value)
+        return rows, cols, values
+
+    def todense(self, dtype=float):
+
+        M = zeros(self.shape, dtype=dtype)
+        for key, value in self.entries.items():
+            M[key] = value
+        return M
+
+    def tocsc(self, dtype=float):
+
+        rows, cols, values = self.triplets()
+        return coo_matrix((values, (rows, cols)), shape=self.shape,
+                          dtype=dtype).tocsc()
+
+
+def sparse_block_matrix(G, B, C, D):
+    """Combine the G, B, C, and D stamp matrices into the MNA A matrix
+    in compressed sparse column (CSC) format."""
+
+    num_nodes = G.shape[0]
+    N = num_nodes + D.shape[0]
+
+    rows = []
+    cols = []
+    values = []
+    for M, row_offset, col_offset in ((G, 0, 0), (B, 0, num_nodes),
+                                      (C, num_nodes, 0),
+                                      (D, num_nodes, num_nodes)):
+        r, c, v = M.triplets(row_offset, col_offset)
+        rows.extend(r)
+        cols.extend(c)
+        values.extend(v)
+
+    dtype = complex if any(M.is_complex for M in (G, B, C, D)) else float
+    return coo_matrix((values, (rows, cols)), shape=(N, N),
+                      dtype=dtype).tocsc()
+
+
+def sparse_block_vector(Is, Es):
+    """Combine the Is and Es stamp vectors into the MNA Z vector."""
+
+    dtype = complex if Is.is_complex or Es.is_complex else float
+    return concatenate((Is.todense(dtype), Es.todense(dtype))).squeeze(axis=1)
+
+
+def sparse_solve(A, Z):
+    """Solve the sparse system A x = Z using a sparse LU factorisation.
+    A ValueError is raised if A is singular."""
+
+    if A.shape[0] == 0:
+        return zeros(0)
+
+    if Z.dtype == complex and A.dtype != complex:
+        A = A.astype(complex)
+    elif A.dtype == complex and Z.dtype != complex:
+        Z = Z.astype(complex)
+
+    try:
+        return splu(A).solve(Z)
+    except RuntimeError as e:
+        raise ValueError('Matrix is singular: %s' % e)
+
+
+def stamp_block_matrix(G, B, C, D):
+    """Combine the G, B, C, and D stamp matrices into a stamp matrix
+    for the MNA A matrix."""
+
+    num_nodes = G.shape[0]
+    N = num_nodes + D.shape[0]
+
+    A = SparseStampMatrix(N, N, numeric=False)
+    for M, row_offset, col_offset in ((G, 0, 0), (B, 0, num_nodes),
+                                      (C, num_nodes, 0),
+                                      (D, num_nodes, num_nodes)):
+        for (row, col), value in M.entries.items():
+            A[row + row_offset, col + col_offset] = value
+    return A
+
+
+def stamp_block_vector(Is, Es):
+    """Combine the Is and Es stamp vectors into a stamp vector for the
+    MNA Z vector."""
+
+    num_nodes = Is.shape[0]
+    N = num_nodes + Es.shape[0]
+
+    Z = SparseStampMatrix(N, 1, numeric=False)
+    for M, row_offset in ((Is, 0), (Es, num_nodes)):
+        for (row, col), value in M.entries.items():
+            Z[row + row_offset] = value
+    return Z
+
+
+def affine_split(value, var):
+    """Split SymPy expression `value` into numbers a0 and a1, where
+    value = a0 + a1 * var.  A ValueError is raised if value is not
+    affine in var or if it has a symbolic coefficient."""
+
+    value = sym.sympify(value)
+    if not value.is_polynomial(var):
+        raise ValueError('%s is not affine in %s' % (value, var))
+    poly = sym.Poly(value, var)
+    if poly.degree() > 1:
+        raise ValueError('%s is not affine in %s' % (value, var))
+    return (numeric_value(poly.coeff_monomial(1)),
+            numeric_value(poly.coeff_monomial(var)))
+
+
+def numeric_function(value, var):
+    """Return a function that evaluates SymPy expression `value` for an
+    array of values of `var`.  A ValueError is raised if value has a
+    symbol other than var."""
+
+    value = sym.sympify(value)
+    if value.free_symbols - set((var, )):
+        raise ValueError('Non-numeric value %s' % value)
+
+    func = sym.lambdify(var, value, 'numpy')
+
+    def evaluate(vector):
+        result = zeros(vector.shape, dtype=complex)
+        result[...] = func(vector)
+        return result
+
+    return evaluate
+
+
+class SparseDescriptor(object):
+    """This class represents the MNA equations in descriptor form,
+    (A0 + s A1) x = Z(s), where A0 and A1 are sparse numerical
+    matrices.  The equations can be solved for a vector of values of
+    s; the few entries of A that are not affine in s, say for a
+    transfer function, and the entries of Z are evaluated for each
+    value of s.  The poles and zeros are found from the generalised
+    eigenvalues of the matrix pencil.
+
+    A and Z are stamp matrices with SymPy entries and var is the SymPy
+    symbol for s.  A ValueError is raised if an entry has a symbol
+    other than var."""
+
+    # Largest A matrix solved for all the values of s as a dense
+    # batch; larger matrices are solved with a sparse LU
+    # factorisation for each value of s.
+    dense_size = 100
+
+    def __init__(self, A, Z, var):
+
+        N = A.shape[0]
+        self.shape = A.shape
+        self.A0 = SparseStampMatrix(N, N)
+        self.A1 = SparseStampMatrix(N, N)
+        self.other = {}
+
+        for key, value in A.entries.items():
+            try:
+                a0, a1 = affine_split(value, var)
+            except ValueError:
+                self.other[key] = numeric_function(value, var)
+                continue
+            self.A0[key] = a0
+            self.A1[key] = a1
+
+        self.Z = {}
+        for (row, col), value in Z.entries.items():
+            self.Z[row] = numeric_function(value, var)
+
+    def solve(self, svector):
+        """Return an array of the unknowns with a row for each value of
+        s and a column for each unknown.  A ValueError is raised if A
+        is singular."""
+
+        svector = asarray(svector, dtype=complex).ravel()
+        N = self.shape[0]
+        M = len(svector)
+
+        Z = zeros((M, N), dtype=complex)
+        for row, func in self.Z.items():
+            Z[:, row] = func(svector)
+
+        if N == 0:
+            return Z
+
+        if N <= self.dense_size:
+            A = (self.A0.todense(complex)[None, :, :] +
+                 svector[:, None, None] * self.A1.todense(complex)[None, :, :])
+            for (row, col), func in self.other.items():
+                A[:, row, col] += func(svector)
+            try:
+                return linalg.solve(A, Z[:, :, None])[:, :, 0]
+            except linalg.LinAlgError as e:
+                raise ValueError('Matrix is singular: %s' % e)
+
+        A0 = self.A0.tocsc(complex)
+        A1 = self.A1.tocsc(complex)
+        others = [(key, func(svector)) for key, func in self.other.items()]
+
+        X = zeros((M, N), dtype=complex)
+        for m, sval in enumerate(svector):
+            A = A0 + sval * A1
+            if others != []:
+                A = A.tolil()
+                for key, values in others:
+                    A[key] += values[m]
+                A = A.tocsc()
+            try:
+                X[m] = splu(A).solve(Z[m])
+            except RuntimeError as e:
+                raise ValueError('Matrix is singular: %s' % e)
+        return X
+
+    def _check_affine(self):
+
+        if self.other != {}:
+            raise ValueError('MNA A matrix is not affine in s')
+
+    def _dense_pencil(self):
+
+        dtype = complex if self.A0.is_complex or self.A1.is_complex else float
+        return self.A0.todense(dtype), self.A1.todense(dtype)
+
+    def _eigenvalues(self, M0, M1):
+        """Return the finite generalised eigenvalues s, where
+        det(M0 + s M1) = 0.  A ValueError is raised if the pencil is
+        singular, i.e., det(M0 + s M1) is zero for all s."""
+
+        from scipy.linalg import eigvals, norm
+
+        if M0.shape[0] == 0:
+            return zeros(0, dtype=complex)
+
+        # The pencil is regular if M0 + s M1 has full rank for almost
+        # all s.  Since MNA matrices are often badly scaled, test this
+        # at pseudo-random complex s spanning many decades, after
+        # scaling the rows and columns.
+        if not any(_full_rank(M0 + s0 * M1) for s0 in _test_points()):
+            raise ValueError('Singular matrix pencil, the circuit is '
+                             'degenerate or the transfer function is zero')
+
+        norm0 = norm(M0, 1) or 1
+        norm1 = norm(M1, 1)
+        if norm1 == 0:
+            return zeros(0, dtype=complex)
+
+        eps = finfo(float).eps
+        alpha, beta = eigvals(M0, -M1, homogeneous_eigvals=True)
+        # The infinite eigenvalues have beta = 0 apart from rounding
+        # errors.  Compare alpha and beta relative to the scale of the
+        # matrices they are associated with.
+        keep = ((abs(beta) / norm1 > 100 * eps * abs(alpha) / norm0)
+                & isfinite(alpha))
+        return sort_complex(alpha[keep] / beta[keep])
+
+    def poles(self):
+        """Return the values of s where A0 + s A1 is singular.  A
+        ValueError is raised if A is not affine in s."""
+
+        self._check_affine()
+        return self._eigenvalues(*self._dense_pencil())
+
+    def zeros(self, b, c):
+        """Return the zeros of the transfer function c^T x / u, where
+        (A0 + s A1) x = b u.  These are found from the system matrix
+        [[A0 + s A1, -b], [c^T, 0]].  Note, zeros that cancel with
+        poles are not removed.  A ValueError is raised if A is not
+        affine in s."""
+
+        self._check_affine()
+
+        N = self.shape[0]
+        A0, A1 = self._dense_pencil()
+        M0 = block([[A0, -asarray(b).reshape(N, 1)],
+                    [asarray(c).reshape(1, N), zeros((1, 1))]])
+        M1 = zeros((N + 1, N + 1), dtype=A1.dtype)
+        M1[:N, :N] = A1
+        return self._eigenvalues(M0, M1)
+
+
+def _test_points():
+    """Return pseudo-random complex values with magnitudes spanning
+    1e-15 to 1e15."""
+
+    from numpy.random import default_rng
+
+    rng = default_rng(42)
+    phases = rng.uniform(0.1, 1.5, 11)
+    return 10.0 ** arange(-15, 16, 3) * exp(1j * phases)
+
+
+def _full_rank(M):
+    """Return True if the dense matrix M has full rank, after scaling
+    its rows and columns to have a maximum magnitude of one."""
+
+    from scipy.linalg import svdvals
+
+    M = asarray(M)
+    for axis in (1, 0):
+        scale = abs(M).max(axis=axis, keepdims=True)
+        if (scale == 0).any():
+            return False
+        M = M / scale
+    sv = svdvals(M)
+    return sv[-1] > max(M.shape) * finfo(float).eps * sv[0]
@@ -17,6 +17,7 @@ from sympy import Basic, Symbol, Expr, Atom
 from sympy.core.function import AppliedUndef
 import sympy as sym
 import re
+from math import isfinite
 from .state import state
 from .simplify import simplify_dirac_delta, simplify_heaviside
 
@@ -177,7 +178,10 @@ def sympify1(arg, symbols=None, evaluate=True, **assumptions):
 
     if isinstance(arg, float):
         # Note, need to convert to string to achieve a rational
-        # representation.
+        # representation.  Creating the Rational directly is much
+        # faster than parsing the string but does not handle inf or nan.
+        if isfinite(arg):
+            return sym.Rational(str(arg))
         return sym.sympify(str(arg), rational=True, evaluate=evaluate)
         
     if isinstance(arg, str):
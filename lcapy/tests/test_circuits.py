@@ -2,6 +2,7 @@ from lcapy import Circuit, R, C, L, V, I, v, exp, Heaviside, Vs, Vnoisy, Vt, It,
 from lcapy import Zs, s, t
 import unittest
 import sympy as sym
+import numpy as np
 
 
 class LcapyTester(unittest.TestCase):
@@ -580,3 +581,276 @@ class LcapyTester(unittest.TestCase):
         self.assertEqual(expr(Z[1, 0]), expr('R2'), "Z21")
         self.assertEqual(expr(Z[1, 1]), expr('R1 + R2'), "Z22")
         
+
+    def test_sparse_engine(self):
+        """Lcapy: check sparse MNA engine
+
+        """
+        from lcapy import config
+
+        a = Circuit("""
+        V1 1 0 10
+        R1 1 2 2
+        R2 2 0 3
+        L1 2 3 1e-3
+        R3 3 0 5""")
+
+        mna_engine = config.mna_engine
+        try:
+            config.mna_engine = 'sparse'
+            self.assertAlmostEqual(float(a[2].V.dc.expr), 150 / 31, 10,
+                                   "sparse node voltage incorrect")
+            self.assertAlmostEqual(float(a.L1.I.dc.expr), 30 / 31, 10,
+                                   "sparse inductor current incorrect")
+            self.assertAlmostEqual(float(a.V1.I.dc.expr), 80 / 31, 10,
+                                   "sparse source current incorrect")
+
+            # This has symbolic values so falls back on symbolic engine.
+            b = Circuit("""
+            V1 1 0 10
+            R1 1 2
+            R2 2 0""")
+            self.assertEqual(b[2].V.dc, expr('10 * R2 / (R1 + R2)'),
+                             "symbolic fallback incorrect")
+        finally:
+            config.mna_engine = mna_engine
+
+    def test_matrix_solve_method(self):
+        """Lcapy: check MNA matrix solve methods
+
+        """
+        from lcapy import config
+
+        matrix_solve_method = config.matrix_solve_method
+        try:
+            for method in ('inverse', 'LU', 'FFLU', 'GE', 'DM-LU',
+                           'lazy-LU', 'cramer'):
+                config.matrix_solve_method = method
+                a = Circuit("""
+                V1 1 0 {V1 / s}
+                R1 1 2
+                C1 2 0
+                L1 2 3
+                R2 3 0""")
+                self.assertEqual2(a.L1.I.s, expr('V1 / (s * (R1 + R2 + s * (C1 * R1 * R2 + L1) + s**2 * C1 * L1 * R1))'), "L1 current incorrect with method %s" % method)
+        finally:
+            config.matrix_solve_method = matrix_solve_method
+
+    def test_lazy_solve(self):
+        """Lcapy: check unknowns found on demand
+
+        """
+        from lcapy import config
+
+        matrix_solve_method = config.matrix_solve_method
+        try:
+            config.matrix_solve_method = 'lazy-LU'
+            a = Circuit("""
+            V1 1 0 {V1 / s}
+            R1 1 2
+            C1 2 0
+            R2 2 3
+            C2 3 0""")
+            self.assertEqual2(a[3].V.s, expr('V1 / (s * (1 + s * (C1 * R1 + C2 * R1 + C2 * R2) + s**2 * C1 * C2 * R1 * R2))'), "V3 incorrect")
+            sub = a.sub['s']
+            self.assertEqual(len(sub._results.cache), 1, "Too many unknowns simplified")
+            self.assertEqual2(a.V1.I.s, expr('V1 * (C1 + C2 + s * C1 * C2 * R2) / (1 + s * (C1 * R1 + C2 * R1 + C2 * R2) + s**2 * C1 * C2 * R1 * R2)'), "I incorrect")
+        finally:
+            config.matrix_solve_method = matrix_solve_method
+
+    def test_simplify_policy(self):
+        """Lcapy: check simplification policy
+
+        """
+        a = Circuit("""
+        V1 1 0 {V1 / s}
+        R1 1 2
+        C1 2 0""")
+
+        a.simplify_policy = 'cancel'
+        self.assertEqual(a.kill_except('V1').simplify_policy, 'cancel',
+                         "policy not inherited")
+        V2 = a.sub['s'].Vdict[2]
+        self.assertEqual(V2.expr, sym.cancel(expr('V1 / (s * (1 + s * C1 * R1))').expr), "cancel policy incorrect")
+
+        for policy in ('none', 'factor', 'full'):
+            a.simplify_policy = policy
+            self.assertEqual2(a[2].V.s, expr('V1 / (s * (1 + s * C1 * R1))'), "V2 incorrect for policy %s" % policy)
+        self.assertRaises(ValueError, setattr, a, 'simplify_policy', 'foo')
+
+    def test_lazy_dict(self):
+        """Lcapy: check lazily evaluated node voltages
+
+        """
+        from lcapy.mna import LazyValue
+
+        a = Circuit("""
+        V1 1 0 {V1 / s}
+        R1 1 2
+        C1 2 0""")
+
+        def lazy(values):
+            return any([isinstance(value, LazyValue) for value in values])
+
+        Vdict = a.sub['s'].Vdict
+        self.assertFalse(lazy(dict(Vdict).values()), "dict has LazyValue")
+        self.assertFalse(lazy(Vdict.copy().values()), "copy has LazyValue")
+
+        a = Circuit(str(a))
+        Vdict = a.sub['s'].Vdict
+        self.assertEqual(Vdict.pop('2').expr,
+                         expr('V1 / (s * (1 + s * C1 * R1))').expr,
+                         "pop incorrect")
+        self.assertFalse(lazy([Vdict.popitem()[1]]), "popitem has LazyValue")
+        self.assertFalse(lazy([Vdict.setdefault('1')]),
+                         "setdefault has LazyValue")
+
+        """Lcapy: check incremental MNA stamp update
+
+        """
+        from lcapy import config
+
+        a = Circuit("""
+        V1 1 0 {V1 / s}
+        R1 1 2
+        C1 2 0
+        L1 2 3
+        R2 3 0""")
+        a[3].V
+        a.add('R2 3 0 5')
+        self.assertTrue(a.sub['s']._previous._is_analysed, "previous not kept")
+        b = Circuit(str(a))
+        self.assertEqual2(a[3].V, b[3].V, "V3 incorrect")
+        self.assertEqual(a.sub['s']._A, b.sub['s']._A, "A incorrect")
+
+        mna_engine = config.mna_engine
+        try:
+            config.mna_engine = 'sparse'
+            a = Circuit("""
+            V1 1 0 10
+            R1 1 2 1
+            R2 2 0 3
+            R3 2 3 4
+            R4 3 0 2""")
+            a[3].V
+            a.add('R4 3 0 4')
+            self.assertEqual(a[3].V.dc.expr, Circuit(str(a))[3].V.dc.expr,
+                             "V3 incorrect for sparse engine")
+        finally:
+            config.mna_engine = mna_engine
+
+    def test_parallel_solve(self):
+        """Lcapy: check subnetlists solved concurrently
+
+        """
+        from lcapy import config
+
+        a = Circuit("""
+        V1 1 0 {V1 / s}
+        V2 2 1 ac 3
+        R1 2 3
+        C1 3 0""")
+        b = Circuit(str(a))
+
+        mna_processes = config.mna_processes
+        try:
+            config.mna_processes = 2
+            self.assertEqual2(a[3].V.s, b[3].V.s, "V3 incorrect")
+            for sub in a.sub.values():
+                # The workers do not simplify; only the node voltage
+                # needed has been simplified.
+                self.assertEqual(sub._results.policy, sub.simplify_policy,
+                                 "Unknowns simplified by worker for %s" % sub.kind)
+                self.assertEqual(len(sub._results.cache), 1,
+                                 "Too many unknowns simplified for %s" % sub.kind)
+            self.assertEqual2(a.R1.I.s, b.R1.I.s, "I incorrect")
+            for sub in a.sub.values():
+                self.assertTrue(hasattr(sub, '_Vdict'), "%s not solved" % sub.kind)
+        finally:
+            config.mna_processes = mna_processes
+
+    def test_ac_sweep(self):
+        """Lcapy: check numerical frequency sweep
+
+        """
+        from lcapy.sparsematrix import SparseDescriptor
+
+        a = Circuit("""
+        V1 1 0 s {1 / (s + 10)}
+        R1 1 2 100
+        C1 2 3 1e-6
+        L1 3 0 1e-3
+        I1 2 0 s 1e-3
+        R2 2 0 1000""")
+        f = np.logspace(1, 5, 9)
+        names = [2, 'R1', 'C1', 'L1', 'V1', 'I1']
+        X = a.ac_sweep(f, names)
+        self.assertEqual(X.shape, (len(names), len(f)), "Incorrect shape")
+        for name, x in zip(names, X):
+            if isinstance(name, int):
+                ref = a[name].V(s).frequency_response(f)
+            else:
+                ref = a[name].I(s).frequency_response(f)
+            self.assertTrue(np.allclose(x, ref), "%s incorrect" % name)
+
+        dense_size = SparseDescriptor.dense_size
+        try:
+            SparseDescriptor.dense_size = 0
+            b = Circuit(str(a))
+            self.assertTrue(np.allclose(b.ac_sweep(f, names), X),
+                            "Sparse sweep incorrect")
+        finally:
+            SparseDescriptor.dense_size = dense_size
+        self.assertTrue(np.allclose(a.ac_sweep(f, 0), 0), "Ground incorrect")
+
+        c = Circuit("""
+        V1 1 0 s {1 / s}
+        R1 1 2 100
+        C1 2 0 1e-6 2""")
+        self.assertRaises(ValueError, c.ac_sweep, f, 2)
+
+    def test_numeric_poles_zeros(self):
+        """Lcapy: check numerical poles and zeros
+
+        """
+        a = Circuit("""
+        R1 1 2 100
+        C1 2 3 1e-6
+        L1 3 0 1e-3
+        R2 2 0 1000""")
+        H = a.transfer(1, 0, 2, 0)
+
+        def roots(values):
+            return np.sort_complex(np.array([complex(value.expr)
+                                             for value in values]))
+
+        self.assertTrue(np.allclose(a.transfer_poles(1, 0, 2, 0),
+                                    roots(H.poles(aslist=True))),
+                        "Poles incorrect")
+        self.assertTrue(np.allclose(a.transfer_zeros(1, 0, 2, 0),
+                                    roots(H.zeros(aslist=True))),
+                        "Zeros incorrect")
+        # With node 1 open-circuit, the natural frequencies are
+        # those of the series RLC circuit formed by R2, C1, and L1.
+        self.assertTrue(np.allclose(a.poles(),
+                                    np.sort_complex(np.roots([1e-9, 1e-3, 1]))),
+                        "Circuit poles incorrect")
+
+        # Badly scaled circuit.
+        b = Circuit("""
+        R1 1 2 1e9
+        C1 2 0 1e-12
+        R2 2 3 1e9
+        C2 3 0 1e-12""")
+        self.assertTrue(np.allclose(b.transfer_poles(1, 0, 3, 0),
+                                    np.sort_complex(np.roots([1e-6, 3e-3, 1]))),
+                        "Badly scaled poles incorrect")
+        self.assertEqual(len(b.transfer_zeros(1, 0, 3, 0)), 0,
+                         "Badly scaled zeros incorrect")
+
+        # The transfer function to the voltage across a wire is zero.
+        c = Circuit("""
+        R1 1 2 100
+        C1 2 0 1e-6
+        W 2 3""")
+        self.assertRaises(ValueError, c.transfer_zeros, 1, 0, 2, 3)
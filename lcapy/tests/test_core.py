@@ -354,6 +354,152 @@ class LcapyTester(unittest.TestCase):
         self.assertEqual(a.evaluate(2j), 1 + 1j, "Evaluate fail for sqrt(1+1j)")
         self.assertEqual(a.evaluate(4), 2, "Evaluate fail for sqrt(4)")
 
+    def test_evaluate_vector(self):
+        """Lcapy: check evaluate for arrays
+
+        """
+        import numpy as np
+
+        tv = np.linspace(-1, 2, 7)
+        a = exp(-2 * t) * Heaviside(t)
+        self.assertTrue(np.allclose(a.evaluate(tv),
+                                    np.exp(-2 * tv) * (tv >= 0)),
+                        "Evaluate fail for exp(-2 * t) * u(t)")
+        # Negative arguments of sqrt give complex results.
+        b = sqrt(t)
+        self.assertTrue(np.allclose(b.evaluate(tv), np.sqrt(tv + 0j)),
+                        "Evaluate fail for sqrt(t)")
+        # The exponent is limited to avoid overflow.
+        c = exp(t)
+        self.assertTrue(np.isfinite(c.evaluate((0, 1e4))).all(),
+                        "Evaluate fail for exp(1e4)")
+        d = DiracDelta(t)
+        self.assertEqual(d.evaluate(tv)[2], np.inf,
+                         "Evaluate fail for DiracDelta(0)")
+        # Constant expressions give a vector.
+        self.assertEqual((t * 0 + 3).evaluate(tv).shape, (7, ),
+                         "Evaluate fail for constant")
+        for m in range(len(tv)):
+            self.assertEqual(a.evaluate(tv)[m], a.evaluate(tv[m]),
+                             "Vector and scalar evaluate differ")
+
+    def test_evaluate_grid(self):
+        """Lcapy: check evaluate_grid
+
+        """
+        import numpy as np
+
+        tv = np.linspace(-1, 2, 4)
+        a = expr('exp(-t / tau) * u(t)')
+        result = a.evaluate_grid(t=tv, tau=[1, 2, 4])
+        self.assertEqual(result.shape, (4, 3), "Incorrect shape")
+        for m, tau in enumerate((1, 2, 4)):
+            self.assertTrue(np.allclose(result[:, m],
+                                        np.exp(-tv / tau) * (tv >= 0)),
+                            "Incorrect values for tau=%s" % tau)
+        self.assertEqual(a.evaluate_grid(t=1, tau=2), np.exp(-0.5),
+                         "Incorrect value for scalars")
+        self.assertRaises(ValueError, a.evaluate_grid, t=tv)
+
+        H = expr('1 / (s * R * C + 1)')
+        fv = np.array([0, 100, 1000])
+        Rv = np.array([1e3, 2e3])
+        result = H.frequency_response(fv, R=Rv, C=1e-6)
+        self.assertEqual(result.shape, (3, 2), "Incorrect shape")
+        self.assertTrue(np.allclose(result,
+                                    1 / (2j * np.pi * fv[:, None] * Rv * 1e-6 + 1)),
+                        "Incorrect frequency response")
+
+    def test_frequency_response(self):
+        """Lcapy: check numerical frequency response
+
+        """
+        import numpy as np
+
+        fv = np.logspace(0, 4, 50)
+        sv = 2j * np.pi * fv
+        H = (s + 3) / (s**3 + 20 * s**2 + 100 * s + 1000) * exp(-s / 1000)
+        ref = (sv + 3) / (sv**3 + 20 * sv**2 + 100 * sv + 1000) * np.exp(-sv / 1000)
+        self.assertTrue(np.allclose(H.frequency_response(fv), ref),
+                        "Incorrect frequency response")
+        self.assertTrue(np.allclose(H.angular_frequency_response(2 * np.pi * fv), ref),
+                        "Incorrect angular frequency response")
+        self.assertTrue(np.allclose(H.frequency_response(fv),
+                                    H(j * 2 * pi * f).evaluate(fv)),
+                        "Frequency response differs from evaluate")
+        self.assertEqual((1 / (s + 1)).frequency_response(0), 1,
+                         "Incorrect DC response")
+        # Expressions that are not rational functions are substituted.
+        self.assertTrue(np.allclose(sqrt(s).frequency_response(fv),
+                                    np.sqrt(sv)),
+                        "Incorrect frequency response for sqrt(s)")
+
+    def test_response(self):
+        """Lcapy: check response to sampled signal
+
+        """
+        import numpy as np
+
+        tv = np.linspace(0, 5, 501)
+        x = np.ones(len(tv))
+        for method in ('convolve', 'fft', 'lsim'):
+            y = (1 / (s + 1)).response(x, tv, method=method)
+            self.assertTrue(np.allclose(y, 1 - np.exp(-tv), atol=1e-4),
+                            "Incorrect step response for %s" % method)
+            y = ((s + 2) / (s + 1)).response(x, tv, method=method)
+            self.assertTrue(np.allclose(y, 2 - np.exp(-tv), atol=1e-4),
+                            "Incorrect response with polynomial part for %s" % method)
+            y = (exp(-s) / (s + 1)).response(x, tv, method=method)
+            self.assertTrue(np.allclose(y, (1 - np.exp(1 - tv)) * (tv >= 1),
+                                        atol=1e-4),
+                            "Incorrect delayed response for %s" % method)
+
+        x = np.sin(tv)
+        y1 = (s + 1 / (s + 1)).response(x, tv, method='fft')
+        y2 = (s + 1 / (s + 1)).response(x, tv, method='lsim')
+        self.assertTrue(np.allclose(y1, y2, atol=1e-4),
+                        "Responses differ for fft and lsim")
+        self.assertRaises(ValueError, (1 / (s + 1)).response, x, tv,
+                          method='foo')
+
+    def test_evaluate_cache(self):
+        """Lcapy: check evaluate cache
+
+        """
+        from lcapy.expr import evaluate_cache_info, evaluate_cache_clear
+        from lcapy import config
+
+        evaluate_cache_clear()
+        a = exp(-2 * t) * Heaviside(t)
+        self.assertEqual(a.evaluate(0), 1, "Evaluate fail for exp(0)")
+        self.assertEqual(a.evaluate(-1), 0, "Evaluate fail for t < 0")
+        info = evaluate_cache_info()
+        self.assertEqual(info['misses'], 1, "Cache miss count")
+        self.assertEqual(info['hits'], 1, "Cache hit count")
+
+        # Another expression has its own function.
+        self.assertEqual((3 * a).evaluate(0), 3, "Evaluate fail for 3 * a")
+        self.assertEqual(evaluate_cache_info()['misses'], 2,
+                         "Cache miss count")
+
+        size = config.evaluate_cache_size
+        try:
+            config.evaluate_cache_size = 2
+            (a + 1).evaluate(0)
+            self.assertEqual(evaluate_cache_info()['size'], 2,
+                             "Cache not limited")
+            a.evaluate(0)
+            self.assertEqual(evaluate_cache_info()['misses'], 4,
+                             "Least recently used function not discarded")
+        finally:
+            config.evaluate_cache_size = size
+            evaluate_cache_clear()
+
+        # An array argument only needs the vector function.
+        a.evaluate([0, 1, 2])
+        self.assertEqual(evaluate_cache_info()['misses'], 1,
+                         "Cache miss count for array argument")
+
     def test_zp2k(self):
 
         self.assertEqual(zp2tf([], [0, -1]), 1 / (s * (s + 1)), "zp2tf")
@@ -16,3 +16,58 @@ class LcapyTester(unittest.TestCase):
 
         self.assertEqual(a(z), 1, "ui(n)")
         
+
+    def test_lfilter(self):
+
+        a = symbol('a')
+        x = seq((1, 0, 0, 0))
+
+        self.assertEqual(x.lfilter([1], [1, -a]).vals,
+                         [1, a, a**2, a**3], "symbolic IIR")
+        self.assertEqual(x.lfilter([1], [1, -0.5]).vals,
+                         [1, 0.5, 0.25, 0.125], "numeric IIR")
+        self.assertEqual(seq((1, 2, 3)).lfilter([1, 1]).vals,
+                         [1, 3, 5], "numeric FIR")
+        self.assertEqual(seq((1, a, 3)).lfilter([1, 1]).vals,
+                         [1, a + 1, a + 3], "symbolic FIR")
+        self.assertEqual(x.lfilter([1], [1, -1]).vals,
+                         [1, 1, 1, 1], "integer IIR")
+        self.assertEqual(seq((1, 2, 3)).lfilter([1], [2, -1]).vals,
+                         [sym.Rational(1, 2), sym.Rational(5, 4),
+                          sym.Rational(17, 8)], "integer IIR with a0")
+        self.assertEqual(seq((1, 2, 3)).lfilter([1], [3]).vals,
+                         [sym.Rational(1, 3), sym.Rational(2, 3), 1],
+                         "rational FIR")
+        self.assertEqual(x.lfilter([1], [1, -sym.Rational(1, 3)]).vals,
+                         [1, sym.Rational(1, 3), sym.Rational(1, 9),
+                          sym.Rational(1, 27)], "rational IIR")
+
+    def test_sequence_float(self):
+
+        from lcapy.sequence import Sequence, _has_float
+
+        a = Sequence([0.5, 1.5, 2.0])
+        b = seq((1, 2, 3))
+        self.assertTrue(_has_float(a), "float sequence")
+        self.assertFalse(_has_float(b), "integer sequence")
+        self.assertTrue(_has_float(a[1:]), "float sequence after slicing")
+        self.assertTrue(_has_float(a + b), "float sequence after addition")
+        self.assertTrue(_has_float(Sequence(a)), "float sequence after copy")
+        self.assertEqual(a[1:].n, [1, 2], "slice indices")
+        self.assertEqual((a + b).vals, [1.5, 3.5, 5], "addition")
+        self.assertEqual((b - b).vals, [0, 0, 0], "subtraction")
+        self.assertEqual((b[1:] + b).vals, [1, 4, 6], "addition with offset")
+        # Floats filtered numerically, the rest exactly.
+        self.assertTrue(_has_float(a[1:].lfilter([1], [3])),
+                        "float filtered sequence")
+        self.assertEqual(b.lfilter([1], [3]).vals,
+                         [sym.Rational(1, 3), sym.Rational(2, 3), 1],
+                         "rational FIR")
+
+    def test_convolve(self):
+
+        a = symbol('a')
+        self.assertEqual(seq((1, 2, 3)).convolve(seq((1, 1))).vals,
+                         [1, 3, 5, 3], "numeric convolve")
+        self.assertEqual(seq((1, 2, a)).convolve(seq((1, 1))).vals,
+                         [1, 3, a + 2, a], "symbolic convolve")
@@ -85,6 +85,36 @@ class LcapyTester(unittest.TestCase):
         bn = b.noisy()
         self.assertEqual(an[1].V.n.expr, bn[1].V.n.expr, "Incorrect noise")
 
+    def test_noisy_shared(self):
+        """Lcapy: check noise subnetlists solved together"""
+
+        from lcapy import config
+
+        a = Circuit("""
+        R1 1 0
+        R2 1 2
+        C1 2 0
+        R3 2 0""")
+        an = a.noisy()
+        an[2].V.n
+        subs = list(an.sub.values())
+        self.assertEqual(len(subs), 3, "Incorrect number of noise sources")
+        self.assertTrue(all(sub._shared is subs[0]._shared for sub in subs),
+                        "Solution not shared")
+
+        matrix_solve_method = config.matrix_solve_method
+        try:
+            for method in ('inverse', 'LU', 'lazy-LU', 'cramer'):
+                config.matrix_solve_method = method
+                bn = a.noisy()
+                cn = a.noisy()
+                for sub in cn.sub.values():
+                    sub._shared = None
+                self.assertEqual(bn[2].V.n.expr, cn[2].V.n.expr,
+                                 "Incorrect noise with method %s" % method)
+        finally:
+            config.matrix_solve_method = matrix_solve_method
+
     def test_noisy_transform1(self):
 
         a = Circuit()
@@ -0,0 +1,359 @@
+from lcapy import Circuit
+import numpy as np
+import unittest
+
+
+class LcapyTester(unittest.TestCase):
+    """Unit tests for lcapy simulator
+
+    """
+
+    def test_VRLC(self):
+        """Lcapy: check simulation of series RLC circuit
+
+        """
+        a = Circuit("""
+        V1 1 0 step 10
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        tv = np.linspace(0, 5, 500)
+
+        for integrator in ('trapezoid', 'backward-euler', 'bdf2', 'tr-bdf2'):
+            results = a.sim(tv, integrator=integrator)
+            self.assertTrue(np.allclose(results.C1.v, a.C1.v.evaluate(tv),
+                                        atol=0.1),
+                            "C1 voltage incorrect for %s" % integrator)
+            self.assertTrue(np.allclose(results.L1.i, a.L1.i.evaluate(tv),
+                                        atol=0.05),
+                            "L1 current incorrect for %s" % integrator)
+
+        # The A matrix is only factored for each unique time step.
+        # With TR-BDF2, both stages have the same A matrix.
+        self.assertEqual(len(a.sim._lu), 1, "A matrix factored too often")
+
+        # BDF2 is second order and so is accurate with larger steps.
+        tv = np.linspace(0, 5, 100)
+        results = a.sim(tv, integrator='bdf2')
+        self.assertTrue(np.allclose(results.C1.v, a.C1.v.evaluate(tv),
+                                    atol=0.05), "C1 voltage incorrect for bdf2")
+
+    def test_sources_evaluate(self):
+        """Lcapy: check vectorised source evaluation
+
+        """
+        from lcapy.simulator import sources_evaluate
+        from lcapy.sym import tsym
+        import sympy as sym
+
+        Zsym = sym.Matrix([0, 2, 10 * sym.Heaviside(tsym - 1),
+                           sym.cos(3 * tsym) * sym.Heaviside(tsym),
+                           sym.Piecewise((1, tsym < 2), (0, True))])
+        tv = np.linspace(0, 3, 7)
+        Z = sources_evaluate(Zsym, tv)
+        self.assertEqual(Z.shape, (5, 7), "Incorrect shape")
+        # Heaviside(0) is taken as 1 as for Expr.evaluate.
+        expected = np.array([np.zeros(7), 2 * np.ones(7),
+                             10 * (tv >= 1), np.cos(3 * tv),
+                             1.0 * (tv < 2)])
+        self.assertTrue(np.allclose(Z, expected), "Incorrect values")
+
+        self.assertRaises(ValueError, sources_evaluate,
+                          sym.Matrix([sym.Symbol('x') * tsym]), tv)
+
+    def test_VRC_sources(self):
+        """Lcapy: check simulation with time-varying sources
+
+        """
+        a = Circuit("""
+        V1 1 0 {10 * cos(3 * t) * u(t)}
+        I1 0 2 {u(t - 1)}
+        R1 1 2 5
+        C1 2 0 0.1""")
+        tv = np.linspace(0, 5, 1000)
+        results = a.sim(tv)
+        self.assertTrue(np.allclose(results.C1.v, a.C1.v.evaluate(tv),
+                                    atol=0.1), "C1 voltage incorrect")
+
+    def test_VRLC_adaptive(self):
+        """Lcapy: check simulation with adaptive time steps
+
+        """
+        a = Circuit("""
+        V1 1 0 step 10
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        tv = np.linspace(0, 5, 500)
+
+        results = a.sim(tv, adaptive=True)
+        self.assertTrue(len(results.t) < len(tv), "Too many time steps")
+        self.assertEqual(results.t[-1], tv[-1], "Incorrect final time")
+        self.assertTrue(np.allclose(results.C1.v, a.C1.v.evaluate(results.t),
+                                    atol=0.05), "C1 voltage incorrect")
+
+        results = a.sim(tv, adaptive=True, interpolate=True)
+        self.assertEqual(len(results.t), len(tv), "Not interpolated")
+        self.assertTrue(np.allclose(results.L1.i, a.L1.i.evaluate(tv),
+                                    atol=0.05), "L1 current incorrect")
+
+    def test_RC_ladder_sparse(self):
+        """Lcapy: check simulation with the sparse engine
+
+        """
+        a = Circuit("""
+        V1 1 0 {u(t)}
+        R1 1 2 1
+        C1 2 0 0.1
+        R2 2 3 1
+        C2 3 0 0.1
+        R3 3 4 1
+        L3 4 0 0.5""")
+        tv = np.linspace(0, 2, 200)
+
+        for integrator in ('trapezoid', 'tr-bdf2'):
+            results1 = a.sim(tv, integrator=integrator)
+            results2 = a.sim(tv, integrator=integrator, engine='sparse')
+            self.assertTrue(np.allclose(results1.C2.v, results2.C2.v),
+                            "C2 voltage differs for %s" % integrator)
+            self.assertTrue(np.allclose(results1.L3.i, results2.L3.i),
+                            "L3 current differs for %s" % integrator)
+
+        self.assertRaises(ValueError, a.sim, tv, engine='foo')
+
+    def test_probes_memmap(self):
+        """Lcapy: check simulation results stored in files for probes
+
+        """
+        import os
+        import tempfile
+
+        a = Circuit("""
+        V1 1 0 step 10
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        tv = np.linspace(0, 5, 500)
+        results1 = a.sim(tv)
+
+        dirname = tempfile.mkdtemp()
+        filename = os.path.join(dirname, 'sim')
+        results2 = a.sim(tv, probes=['C1', 1], filename=filename)
+        self.assertEqual(results2.node_voltages.shape, (3, 500),
+                         "Unprobed nodes stored")
+        self.assertTrue(np.allclose(results1.C1.v, results2.C1.v),
+                        "C1 voltage differs")
+        self.assertTrue(np.allclose(results1.C1.i, results2.C1.i),
+                        "C1 current differs")
+        self.assertTrue(np.allclose(results1[1].v, results2[1].v),
+                        "Node 1 voltage differs")
+        self.assertRaises(ValueError, results2.__getitem__, 2)
+
+        voltages = np.load(filename + '-voltages.npy')
+        self.assertEqual(voltages.shape, (500, 3), "Incorrect file")
+
+        results3 = a.sim(tv, adaptive=True, interpolate=True,
+                         probes=['L1'], filename=filename)
+        self.assertTrue(np.allclose(results3.L1.i, results1.L1.i, atol=0.05),
+                        "L1 current incorrect")
+
+    def test_sweep(self):
+        """Lcapy: check simulation sweep over parameter values
+
+        """
+        from lcapy.simulator import Simulator
+
+        a = Circuit("""
+        V1 1 0 {Vs * u(t)}
+        R1 1 2 R
+        L1 2 3 2
+        C1 3 0 C
+        R2 3 0 10""")
+        tv = np.linspace(0, 5, 200)
+        param_sets = [{'R': 5, 'C': 0.1, 'Vs': 10},
+                      {'R': 4, 'C': 0.12, 'Vs': 8}]
+
+        for integrator in ('trapezoid', 'tr-bdf2'):
+            sweep = Simulator(a).sweep(param_sets, tv, integrator=integrator)
+            self.assertEqual(len(sweep), 2, "Incorrect number of results")
+            for param_set, results1 in zip(param_sets, sweep):
+                results2 = a.subs(param_set).sim(tv, integrator=integrator)
+                self.assertTrue(np.allclose(results1.C1.v, results2.C1.v),
+                                "C1 voltage differs for %s" % integrator)
+                self.assertTrue(np.allclose(results1.R1.i, results2.R1.i),
+                                "R1 current differs for %s" % integrator)
+
+        self.assertRaises(ValueError, Simulator(a).sweep,
+                          [{'R': 5, 'C': 0.1}], tv)
+
+        # Sweep of initial condition.
+        b = Circuit("""
+        V1 1 0 step 1
+        R1 1 2 1
+        C1 2 0 1 v0""")
+        param_sets = [{'v0': 0}, {'v0': 2}]
+        sweep = Simulator(b).sweep(param_sets, tv)
+        for param_set, results1 in zip(param_sets, sweep):
+            results2 = b.subs(param_set).sim(tv)
+            self.assertTrue(np.allclose(results1.C1.v, results2.C1.v),
+                            "C1 voltage differs for %s" % param_set)
+        self.assertRaises(ValueError, Simulator(b).sweep, param_sets, tv,
+                          initial='dc')
+
+    def test_initial(self):
+        """Lcapy: check simulation initial values
+
+        """
+        a = Circuit("""
+        R1 1 0 2
+        C1 1 0 0.1 5""")
+        tv = np.linspace(0, 1, 100)
+        results = a.sim(tv)
+        self.assertTrue(np.allclose(results.C1.v, 5 * np.exp(-5 * tv),
+                                    atol=1e-3), "C1 voltage incorrect")
+
+        b = Circuit("""
+        V1 1 0 {10 + 5 * u(t - 1)}
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        tv = np.linspace(0, 2, 200)
+        for engine in ('symbolic', 'sparse'):
+            results = b.sim(tv, initial='dc', engine=engine)
+            self.assertTrue(np.allclose(results.C1.v[tv < 1], 20 / 3),
+                            "C1 voltage not steady for %s" % engine)
+            self.assertTrue(np.allclose(results.L1.i[tv < 1], 2 / 3),
+                            "L1 current not steady for %s" % engine)
+        self.assertRaises(ValueError, b.sim, tv, initial='foo')
+
+    def test_exact(self):
+        """Lcapy: check simulation with the exact integrator
+
+        """
+        a = Circuit("""
+        V1 1 0 step 10
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        # The exact integrator is accurate for large time steps.
+        tv = np.linspace(0, 5, 11)
+        for engine in ('symbolic', 'sparse'):
+            results = a.sim(tv, integrator='exact', engine=engine)
+            self.assertTrue(np.allclose(results.C1.v, a.C1.v.evaluate(tv)),
+                            "C1 voltage incorrect for %s" % engine)
+            self.assertTrue(np.allclose(results.L1.i, a.L1.i.evaluate(tv)),
+                            "L1 current incorrect for %s" % engine)
+            self.assertTrue(np.allclose(results.R1.v, a.R1.v.evaluate(tv)),
+                            "R1 voltage incorrect for %s" % engine)
+
+        b = Circuit("""
+        V1 1 0 {10 + 5 * u(t - 1)}
+        R1 1 2 5
+        L1 2 3 2
+        C1 3 0 0.1
+        R2 3 0 10""")
+        tv = np.linspace(0, 2, 21)
+        results = b.sim(tv, integrator='exact', initial='dc')
+        self.assertTrue(np.allclose(results.C1.v[tv < 1], 20 / 3),
+                        "C1 voltage not steady")
+
+        self.assertRaises(ValueError, a.sim, tv, integrator='exact',
+                          adaptive=True)
+
+    def test_dependent_sources(self):
+        """Lcapy: check simulation with dependent sources, coupled
+        inductors, and opamps
+
+        """
+        from lcapy import oo
+
+        a = Circuit("""
+        V1 1 0 step 1
+        R1 1 2 1
+        C1 2 0 1
+        E1 3 0 2 0 2
+        R2 3 0 1
+        H1 4 0 V1 2
+        R3 4 0 1""")
+        tv = np.linspace(0, 2, 200)
+        for integrator in ('trapezoid', 'exact'):
+            results = a.sim(tv, integrator=integrator)
+            for name in ('V1', 'E1', 'H1', 'R3'):
+                self.assertTrue(np.allclose(results[name].i,
+                                            a[name].i.evaluate(tv),
+                                            atol=1e-4),
+                                "%s current incorrect for %s" % (name, integrator))
+
+        b = Circuit("""
+        V1 1 0 step 1
+        R1 1 0 1
+        G1 0 2 1 0 2
+        F1 0 2 V1 3
+        C1 2 0 1
+        R2 2 0 1""")
+        results = b.sim(tv)
+        self.assertTrue(np.allclose(results.G1.i, 2), "G1 current incorrect")
+        self.assertTrue(np.allclose(results.F1.i, -3), "F1 current incorrect")
+        self.assertTrue(np.allclose(results.C1.v, b.C1.v.evaluate(tv),
+                                    atol=1e-4), "C1 voltage incorrect")
+
+        c = Circuit("""
+        V1 1 0 step 1
+        R1 1 2 1
+        L1 2 0 1
+        L2 3 0 2
+        K1 L1 L2 0.5
+        R2 3 0 1""")
+        for integrator in ('trapezoid', 'tr-bdf2', 'exact'):
+            for engine in ('symbolic', 'sparse'):
+                results = c.sim(tv, integrator=integrator, engine=engine)
+                self.assertTrue(np.allclose(results.L2.i, c.L2.i.evaluate(tv),
+                                            atol=1e-4),
+                                "L2 current incorrect for %s" % integrator)
+
+        # Inverting lossy integrator with an ideal opamp.
+        d = Circuit("""
+        V1 1 0 step 1
+        R1 1 2 1
+        C1 2 3 1
+        R2 2 3 2
+        E1 3 0 opamp 0 2""")
+        for engine in ('symbolic', 'sparse'):
+            results = d.subs({'E1': oo}).sim(tv, engine=engine)
+            self.assertTrue(np.allclose(results[3].v,
+                                        -2 * (1 - np.exp(-tv / 2)),
+                                        atol=1e-4),
+                            "Opamp output incorrect for %s" % engine)
+        self.assertRaises(ValueError, d.sim, tv)
+
+    def test_impedance(self):
+        """Lcapy: check simulation with constant impedances and admittances
+
+        """
+        from lcapy.simulator import Simulator
+
+        tv = np.linspace(0, 5, 501)
+
+        a = Circuit("""
+        V1 1 0 step 1
+        Z1 1 2 2
+        Y1 2 3 1
+        C1 3 0 1""")
+        for engine in ('symbolic', 'sparse'):
+            results = a.sim(tv, engine=engine)
+            self.assertTrue(np.allclose(results.C1.v, 1 - np.exp(-tv / 3),
+                                        atol=1e-4),
+                            "C1 voltage incorrect for %s" % engine)
+            self.assertTrue(np.allclose(results.Z1.i, results.Y1.i),
+                            "Z1 current incorrect for %s" % engine)
+
+        b = Circuit("""
+        V1 1 0 step 1
+        Z1 1 2 {1 / s}
+        R1 2 0 1""")
+        self.assertRaises(ValueError, Simulator, b)